@@ -0,0 +1,16 @@
+/*
+ * Naive recursive fibonacci for fibonacci.py --impl c, loaded with ctypes.
+ * Built automatically on first use, or by hand:
+ *
+ *   cc -O2 -shared -fPIC -o _fib.so _fib.c
+ *
+ * ctypes releases the GIL around the call, so threads run it in parallel.
+ */
+long fib(long n)
+{
+    if (n <= 0)
+        return 0;
+    if (n == 1)
+        return 1;
+    return fib(n - 1) + fib(n - 2);
+}
@@ -0,0 +1,97 @@
+/*
+ * Native synchronization primitives for mem_safety.py and thread_overhead.py,
+ * loaded with ctypes.
+ * Built automatically on first use (see _load_sync_lib), or by hand:
+ *
+ *   cc -O2 -shared -fPIC -o _sync.so _sync.c
+ *
+ * ctypes releases the GIL around every call, so these run in parallel on
+ * both the GIL and free-threaded builds.
+ */
+#include <stdint.h>
+
+/* Own cache line so the increments don't false-share with anything else */
+static _Alignas(64) int64_t counter;
+
+void counter_reset(void)
+{
+    __atomic_store_n(&counter, 0, __ATOMIC_RELAXED);
+}
+
+int64_t counter_get(void)
+{
+    return __atomic_load_n(&counter, __ATOMIC_SEQ_CST);
+}
+
+void counter_incr(int64_t n)
+{
+    for (int64_t i = 0; i < n; i++)
+        __atomic_fetch_add(&counter, 1, __ATOMIC_RELAXED);
+}
+
+/*
+ * Spin-then-park mutex. State: 0 unlocked, 1 locked, 2 locked with
+ * (possible) waiters. Spin on plain loads for a while, since the
+ * critical sections in mem_safety.py are a single increment, and only
+ * then sleep in the kernel. Unlock only makes a syscall when someone
+ * may be asleep.
+ */
+#define FASTLOCK_SPINS 40
+
+#if defined(__x86_64__) || defined(__i386__)
+#define cpu_relax() __builtin_ia32_pause()
+#elif defined(__aarch64__)
+#define cpu_relax() __asm__ __volatile__("yield")
+#else
+#define cpu_relax() ((void)0)
+#endif
+
+#ifdef __linux__
+#include <linux/futex.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+
+static void park(uint32_t *state)
+{
+    syscall(SYS_futex, state, FUTEX_WAIT_PRIVATE, 2, NULL, NULL, 0);
+}
+
+static void unpark_one(uint32_t *state)
+{
+    syscall(SYS_futex, state, FUTEX_WAKE_PRIVATE, 1, NULL, NULL, 0);
+}
+#else
+#include <sched.h>
+
+static void park(uint32_t *state)
+{
+    (void)state;
+    sched_yield();
+}
+
+static void unpark_one(uint32_t *state)
+{
+    (void)state;
+}
+#endif
+
+void fastlock_acquire(uint32_t *state)
+{
+    for (int i = 0; i < FASTLOCK_SPINS; i++) {
+        uint32_t expected = 0;
+        if (__atomic_load_n(state, __ATOMIC_RELAXED) == 0 &&
+            __atomic_compare_exchange_n(state, &expected, 1, 0,
+                                        __ATOMIC_ACQUIRE, __ATOMIC_RELAXED))
+            return;
+        cpu_relax();
+    }
+    /* Mark the lock contended and sleep until we are the one to take it */
+    while (__atomic_exchange_n(state, 2, __ATOMIC_ACQUIRE) != 0)
+        park(state);
+}
+
+void fastlock_release(uint32_t *state)
+{
+    if (__atomic_exchange_n(state, 0, __ATOMIC_RELEASE) == 2)
+        unpark_one(state);
+}
@@ -1,9 +1,45 @@
 import argparse
+import concurrent.futures
+import ctypes
+import functools
 import multiprocessing
+import os
+import subprocess
 import sys
-import threading
 import time
 
+try:
+    from numba import njit
+except ImportError:
+    # Numba doesn't support the free-threaded build yet
+    njit = None
+
+# CPUs this process may run on, captured before any worker gets pinned
+ALLOWED_CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+
+def _pin_next_cpu(next_idx):
+    """Pool initializer: pin the calling worker to the next allowed CPU (wrapping around)."""
+    with next_idx.get_lock():
+        idx = next_idx.value
+        next_idx.value += 1
+    os.sched_setaffinity(0, {ALLOWED_CPUS[idx % len(ALLOWED_CPUS)]})
+
+def _pin_args(pin, ctx=multiprocessing):
+    """Pool initializer kwargs that give each worker its own CPU, or none."""
+    if not pin:
+        return {}
+    return {"initializer": _pin_next_cpu, "initargs": (ctx.Value("i", 0),)}
+
+_POOLS = {}
+
+def _get_pool(num_threads, pin=False):
+    """Return a ThreadPoolExecutor with num_threads workers, created on first use and reused."""
+    pool = _POOLS.get((num_threads, pin))
+    if pool is None:
+        pool = _POOLS[num_threads, pin] = concurrent.futures.ThreadPoolExecutor(
+            max_workers=num_threads, **_pin_args(pin))
+    return pool
+
 def fibonacci(n):
     if n <= 0:
         return 0
@@ -11,45 +47,111 @@ def fibonacci(n):
         return 1
     else:
         return fibonacci(n - 1) + fibonacci(n - 2)
-    
-def warmup():
-    res = fibonacci(25)
+
+def fib_fast(n):
+    """Fast doubling: O(log n) big-int multiplications instead of O(phi^n) calls"""
+    def rec(k):
+        if k == 0:
+            return 0, 1
+        a, b = rec(k >> 1)      # F(m), F(m+1) with m = k // 2
+        c = a * ((b << 1) - a)  # F(2m)
+        d = a * a + b * b       # F(2m+1)
+        return (d, c + d) if k & 1 else (c, d)
+
+    if n <= 0:
+        return 0
+    return rec(n)[0]
+
+if njit is not None:
+    # Same recursion compiled to native code. nogil lets the threads run it in
+    # parallel on the GIL build too
+    @njit("int64(int64)", nogil=True, cache=True)
+    def _fib_nb(n):
+        if n <= 0:
+            return 0
+        elif n == 1:
+            return 1
+        else:
+            return _fib_nb(n - 1) + _fib_nb(n - 2)
+
+    # Plain function wrapper so Pool can pickle it by name; the recursive
+    # dispatcher itself can't be rebuilt in the workers
+    def fibonacci_nb(n):
+        return _fib_nb(n)
+else:
+    fibonacci_nb = None
+
+_FIB_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_fib.c")
+_FIB_LIB = os.path.splitext(_FIB_SRC)[0] + ".so"
+_fib_c = None
+
+def _load_fib_lib():
+    """Build _fib.c with the system C compiler if needed and return its fib(). None on failure."""
+    try:
+        if not os.path.exists(_FIB_LIB) or os.path.getmtime(_FIB_LIB) < os.path.getmtime(_FIB_SRC):
+            cc = os.environ.get("CC", "cc")
+            subprocess.run([cc, "-O2", "-shared", "-fPIC", "-o", _FIB_LIB, _FIB_SRC],
+                           check=True, capture_output=True)
+        lib = ctypes.CDLL(_FIB_LIB)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    lib.fib.restype = ctypes.c_long
+    lib.fib.argtypes = [ctypes.c_long]
+    return lib.fib
+
+def fibonacci_c(n):
+    # Loaded lazily so spawned/forkserver Pool workers can call it by name
+    global _fib_c
+    if _fib_c is None:
+        _fib_c = _load_fib_lib()
+    return _fib_c(n)
+
+def warmup(fib=fibonacci):
+    res = fib(25)
     print("Warmup = " + str(res))
 
-def single_threaded(vals):
+def single_threaded(vals, fib=fibonacci):
     results = []
 
     start = time.perf_counter()
     for v in vals:
-        results.append(fibonacci(v))
+        results.append(fib(v))
     end = time.perf_counter()
     execution_time = end - start
 
     return results, execution_time
 
-def multi_threaded(vals, num_threads):
+def multi_threaded(vals, num_threads, fib=fibonacci, pin=False):
     results = [None] * len(vals)
 
     start = time.perf_counter()
-    def worker(idx):
-        for i in range(idx, len(results), num_threads):
-            results[i] = fibonacci(vals[i])
-
-    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
-
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    # Workers take the next value as soon as they finish one, so a thread
+    # stuck on fib(35) doesn't hold back the rest. Starting with the largest
+    # values keeps the slowest job from being picked up last
+    order = sorted(range(len(vals)), key=vals.__getitem__, reverse=True)
+    pool = _get_pool(num_threads, pin)
+    for i, res in zip(order, pool.map(fib, [vals[i] for i in order])):
+        results[i] = res
     end = time.perf_counter()
     execution_time = end - start
 
     return results, execution_time
 
-def multi_processed(vals, num_procs):
+def _indexed_fib(fib, item):
+    i, v = item
+    return i, fib(v)
+
+def multi_processed(vals, num_procs, fib=fibonacci, pin=False, start_method=None):
+    ctx = multiprocessing.get_context(start_method)
+    results = [None] * len(vals)
+
     start = time.perf_counter()
-    with multiprocessing.Pool(processes=num_procs) as pool:
-        results = pool.map(fibonacci, vals)
+    # Same largest-first, one-at-a-time scheduling as multi_threaded
+    order = sorted(range(len(vals)), key=vals.__getitem__, reverse=True)
+    with ctx.Pool(processes=num_procs, **_pin_args(pin, ctx)) as pool:
+        work = [(i, vals[i]) for i in order]
+        for i, res in pool.imap_unordered(functools.partial(_indexed_fib, fib), work, chunksize=1):
+            results[i] = res
 
     end = time.perf_counter()
     execution_time = end - start
@@ -61,11 +163,44 @@ if __name__ == "__main__":
     parser.add_argument("--vals", type=int, nargs="+", default=[26, 27, 28, 29, 30, 31, 32, 33, 34, 35],
                         help="List of Fibonacci values to compute (default: 26-35)")
     parser.add_argument("--threads", type=int, default=10, help="Number of threads/processes (default: 10)")
-    parser.add_argument("--mode", type=str, choices=["single", "threaded", "processed", "all"], default="all",
-                        help="Execution mode (default: all)")
+    parser.add_argument("--mode", type=str, choices=["single", "threaded", "processed", "auto", "all"],
+                        default="all",
+                        help="Execution mode; auto uses processes when the GIL would serialize the "
+                             "threads and threads otherwise (default: all)")
+    parser.add_argument("--impl", type=str, choices=["python", "numba", "c"], default="python",
+                        help="Fibonacci implementation: pure Python, Numba-compiled, or C built with "
+                             "the system compiler and called through ctypes (default: python)")
+    parser.add_argument("--algo", type=str, choices=["naive", "fast"], default="naive",
+                        help="naive recursion, or O(log n) fast doubling (default: naive)")
+    parser.add_argument("--start-method", type=str, choices=multiprocessing.get_all_start_methods(),
+                        default=None,
+                        help="multiprocessing start method for processed mode (default: platform default)")
+    parser.add_argument("--pin-cpus", action="store_true",
+                        help="Pin each worker thread/process to its own CPU (Linux)")
     parser.add_argument("--no-warmup", action="store_true", help="Skip warmup")
     args = parser.parse_args()
 
+    fib = fibonacci
+    if args.algo == "fast":
+        if args.impl != "python":
+            print(f"--impl {args.impl} ignored: --algo fast runs on Python ints")
+        fib = fib_fast
+    elif args.impl == "numba":
+        if fibonacci_nb is None:
+            print("numba is not installed, using the pure Python fibonacci")
+        else:
+            fib = fibonacci_nb
+    elif args.impl == "c":
+        _fib_c = _load_fib_lib()
+        if _fib_c is None:
+            print("could not build _fib.c (is a C compiler installed?), using the pure Python fibonacci")
+        else:
+            fib = fibonacci_c
+
+    pin = args.pin_cpus and ALLOWED_CPUS is not None
+    if args.pin_cpus and not pin:
+        print("--pin-cpus ignored: os.sched_setaffinity not available")
+
     # Check GIL status
     try:
         if hasattr(sys, '_is_gil_enabled'):
@@ -77,19 +212,28 @@ if __name__ == "__main__":
 
     print(f"GIL: {gil_status}")
 
+    if args.mode == "auto":
+        # numba (nogil) and ctypes release the GIL, so only pure Python
+        # fibonacci on the GIL build needs processes to run in parallel
+        if gil_status == "ENABLED" and fib not in (fibonacci_nb, fibonacci_c):
+            args.mode = "processed"
+        else:
+            args.mode = "threaded"
+        print(f"auto mode: using {args.mode}")
+
     if not args.no_warmup:
-        warmup()
+        warmup(fib)
 
     if args.mode in ("single", "all"):
-        res, runtime = single_threaded(args.vals)
+        res, runtime = single_threaded(args.vals, fib)
         print(f"Single-threaded results: {res} (runtime: {runtime:.6f} seconds)")
 
     if args.mode in ("threaded", "all"):
-        res, runtime = multi_threaded(args.vals, args.threads)
+        res, runtime = multi_threaded(args.vals, args.threads, fib, pin)
         print(f"{args.threads}-threaded results: {res} (runtime: {runtime:.6f} seconds)")
 
     if args.mode in ("processed", "all"):
-        res, runtime = multi_processed(args.vals, args.threads)
+        res, runtime = multi_processed(args.vals, args.threads, fib, pin, args.start_method)
         print(f"{args.threads}-processed results: {res} (runtime: {runtime:.6f} seconds)")
 
     # Results: 
@@ -1,4 +1,6 @@
 import argparse
+import array
+import collections
 import gc
 import sys
 import threading
@@ -53,56 +55,108 @@ def heavy_allocation_workload(thread_id, num_iterations):
     return len(live_objects)
 
 
-def run_gc_test(num_threads, iterations_per_thread):
-    """Run GC impact test that actually triggers collections"""
+def light_allocation_workload(thread_id, num_iterations):
+    """
+    Same allocation pattern, but the kept objects are cheap for the GC:
+    array.array is never GC-tracked, tuples of ints are untracked by the
+    first collection that examines them, and the deque drops old entries
+    in O(1) instead of copying the live list.
+    Makes the workload allocation-bound rather than GC-bound.
+    """
+    live_objects = collections.deque(maxlen=1500)
+
+    for i in range(num_iterations):
+        temp1 = [thread_id, i] * 100
+        temp2 = {"id": thread_id, "iter": i, "data": [0] * 50}
+        temp3 = (thread_id, i, "temporary")
+
+        kept_list = array.array("q", (thread_id, i)) * 50
+        kept_pair = (thread_id, i)
+
+        live_objects.append(kept_list)
+        live_objects.append(kept_pair)
+
+    return len(live_objects)
+
+
+WORKLOADS = {
+    "heavy": heavy_allocation_workload,
+    "light": light_allocation_workload,
+}
+
+
+TUNED_GEN0_THRESHOLD = 50000
+
+
+def run_gc_test(num_threads, iterations_per_thread, workload="heavy", tune_gc=False):
+    """Run GC impact test that actually triggers collections
+
+    With tune_gc, objects alive before the workload are frozen (skipped by
+    later collections) and the gen 0 threshold is raised for the duration.
+    """
 
     gil_status = "Unknown"
     if hasattr(sys, "_is_gil_enabled"):
         gil_status = "DISABLED" if not sys._is_gil_enabled() else "Enabled"
     print(f"\nGIL status: {gil_status}")
+    print(f"Workload: {workload}")
+    print(f"GC policy: {'tuned' if tune_gc else 'default'}")
     print(f"Threads: {num_threads}")
     print(f"Iterations per thread: {iterations_per_thread:,}")
     print(f"Total operations: {num_threads * iterations_per_thread:,}")
 
-    # Show GC threshold
-    threshold = gc.get_threshold()
-    print(f"\nGC Thresholds:")
-    print(f"Gen 0: {threshold[0]} allocations")
-    print(f"Gen 1: {threshold[1]} Gen 0 collections")
-    print(f"Gen 2: {threshold[2]} Gen 1 collections")
-
     # Get initial GC stats
     gc.collect()  # Start clean
-    initial_stats = get_gc_stats()
-    initial_objects = gc.get_count()
-
-    print(f"\nInitial state:")
-    print(f"Gen 0 collections: {initial_stats['gen0']}")
-    print(f"Gen 1 collections: {initial_stats['gen1']}")
-    print(f"Gen 2 collections: {initial_stats['gen2']}")
-    print(f"Live objects: {sum(initial_objects)}")
-
-    # Run workload
-    print(f"\nRunning allocation workload...")
-
-    start_time = time.time()
-
-    threads = []
-    for i in range(num_threads):
-        t = threading.Thread(
-            target=heavy_allocation_workload, args=(i, iterations_per_thread)
-        )
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
-
-    workload_time = time.time() - start_time
 
-    # Get GC stats after workload
-    after_stats = get_gc_stats()
-    after_objects = gc.get_count()
+    old_threshold = gc.get_threshold()
+    try:
+        if tune_gc:
+            gc.freeze()
+            gc.set_threshold(TUNED_GEN0_THRESHOLD, old_threshold[1], old_threshold[2])
+
+        # Show GC threshold
+        threshold = gc.get_threshold()
+        print(f"\nGC Thresholds:")
+        print(f"Gen 0: {threshold[0]} allocations")
+        print(f"Gen 1: {threshold[1]} Gen 0 collections")
+        print(f"Gen 2: {threshold[2]} Gen 1 collections")
+        if tune_gc:
+            print(f"Frozen objects: {gc.get_freeze_count()}")
+
+        initial_stats = get_gc_stats()
+        initial_objects = gc.get_count()
+
+        print(f"\nInitial state:")
+        print(f"Gen 0 collections: {initial_stats['gen0']}")
+        print(f"Gen 1 collections: {initial_stats['gen1']}")
+        print(f"Gen 2 collections: {initial_stats['gen2']}")
+        print(f"Live objects: {sum(initial_objects)}")
+
+        # Run workload
+        print(f"\nRunning allocation workload...")
+
+        start_time = time.perf_counter_ns()
+
+        threads = []
+        for i in range(num_threads):
+            t = threading.Thread(
+                target=WORKLOADS[workload], args=(i, iterations_per_thread)
+            )
+            threads.append(t)
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        workload_time = (time.perf_counter_ns() - start_time) / 1e9
+
+        # Get GC stats after workload
+        after_stats = get_gc_stats()
+        after_objects = gc.get_count()
+    finally:
+        if tune_gc:
+            gc.set_threshold(*old_threshold)
+            gc.unfreeze()
 
     # Calculate collections during workload
     gen0_collections = after_stats["gen0"] - initial_stats["gen0"]
@@ -119,6 +173,7 @@ def run_gc_test(num_threads, iterations_per_thread):
     print(f"Total:          {total_collections} collections")
 
     return {
+        "gc_policy": "tuned" if tune_gc else "default",
         "workload_time": workload_time,
         "gen0_collections": gen0_collections,
         "gen1_collections": gen1_collections,
@@ -130,6 +185,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GC impact benchmark for multi-threaded allocation workloads")
     parser.add_argument("--threads", type=int, default=8, help="Number of threads (default: 8)")
     parser.add_argument("--iterations", type=int, default=10000, help="Iterations per thread (default: 10000)")
+    parser.add_argument("--workload", type=str, choices=list(WORKLOADS.keys()), default="heavy",
+                        help="'heavy' keeps GC-tracked lists/dicts alive, 'light' keeps untracked "
+                             "arrays/tuples in a bounded deque (default: heavy)")
+    parser.add_argument("--gc-policy", type=str, choices=["default", "tuned", "both"], default="default",
+                        help="'tuned' freezes pre-existing objects and raises the gen 0 threshold to "
+                             f"{TUNED_GEN0_THRESHOLD}; 'both' runs default then tuned (default: default)")
     args = parser.parse_args()
 
-    result = run_gc_test(args.threads, args.iterations)
+    results = []
+    if args.gc_policy in ("default", "both"):
+        results.append(run_gc_test(args.threads, args.iterations, args.workload))
+    if args.gc_policy in ("tuned", "both"):
+        results.append(run_gc_test(args.threads, args.iterations, args.workload, tune_gc=True))
+
+    if len(results) > 1:
+        print(f"\nGC policy comparison:")
+        for r in results:
+            total = r["gen0_collections"] + r["gen1_collections"] + r["gen2_collections"]
+            print(f"{r['gc_policy']:8} {r['workload_time']:.3f} s, {total} collections")
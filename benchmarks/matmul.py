@@ -1,14 +1,41 @@
 import argparse
+import array
+import concurrent.futures
+import functools
 import multiprocessing
 import sys
-import threading
 import time
+from multiprocessing import shared_memory
 
 import numpy as np
 
+try:
+    from numba import config as numba_config, njit, prange
+
+    # The TBB threading layer deadlocks at exit once the fork-based process
+    # pools have run after a parallel=True kernel. The kernels here are only
+    # called from one thread at a time, so the built-in workqueue is enough.
+    numba_config.THREADING_LAYER = "workqueue"
+except ImportError:
+    # Numba doesn't support the free-threaded build yet
+    njit = None
+    prange = range
+
 # Using Python 3.13
 
+_POOLS = {}
+
+def _get_pool(num_threads):
+    """Return a ThreadPoolExecutor with num_threads workers, created on first use and reused."""
+    pool = _POOLS.get(num_threads)
+    if pool is None:
+        pool = _POOLS[num_threads] = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+    return pool
+
 def perf_timer(func):
+    name = func.__name__
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
 
         # Warm up runs
@@ -16,35 +43,35 @@ def perf_timer(func):
         for _ in range(0,2):
             _ = func(*args, **kwargs)
 
+        # Integer nanoseconds, converted to seconds only when reporting
         times = []
 
         for _ in range(0,5):
-            start_time = time.perf_counter()
+            start_time = time.perf_counter_ns()
             result = func(*args, **kwargs)
-            end_time = time.perf_counter()
-            execution_time = end_time - start_time
-            times.append(execution_time)
+            times.append(time.perf_counter_ns() - start_time)
 
-        print(times)
-        print(f"Function {func.__name__!r} took average {sum(times)/len(times):.4f} seconds to execute.")
+        print([t / 1e9 for t in times])
+        print(f"Function {name!r} took average {sum(times) / (len(times) * 1e9):.4f} seconds to execute.")
         return result
     
     return wrapper
 
 @perf_timer
-def threaded_np_matmul(matrices, num_threads):
-    results = [None] * (len(matrices)//2)
+def threaded_np_matmul(A_stack, B_stack, num_threads):
+    n = len(A_stack)
+    results = np.empty((n, A_stack.shape[1], B_stack.shape[2]))
+    chunk = (n + num_threads - 1) // num_threads
 
+    # Each thread does one batched matmul over a contiguous block of pairs,
+    # writing straight into its slice of the output (no temporary result)
     def worker(idx):
-        for i in range(idx, len(results), num_threads):
-            results[i] = np.dot(matrices[i*2], matrices[i*2+1])
+        lo = idx * chunk
+        hi = min(lo + chunk, n)
+        if lo < hi:
+            np.matmul(A_stack[lo:hi], B_stack[lo:hi], out=results[lo:hi])
 
-    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
-
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    list(_get_pool(num_threads).map(worker, range(num_threads)))
 
     return results
 
@@ -57,66 +84,147 @@ def threaded_matmul(matrices, num_threads):
             # print(f"Thread {idx} processing index {i}")
             results[i] = no_np_matmul(matrices[i*2], matrices[i*2+1])
 
-    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
-
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    list(_get_pool(num_threads).map(worker, range(num_threads)))
 
     return results
 
 @perf_timer
-def serial_np_matmul(matrices):
-    results = []
+def threaded_nb_matmul(matrices, num_threads):
+    results = [None] * (len(matrices)//2)
+
+    def worker(idx):
+        for i in range(idx, len(results), num_threads):
+            results[i] = nb_matmul_nogil(matrices[i*2], matrices[i*2+1])
 
-    for i in range(0,len(matrices),2):
-        results.append(np.dot(matrices[i], matrices[i+1]))
+    list(_get_pool(num_threads).map(worker, range(num_threads)))
 
     return results
 
+@perf_timer
+def serial_np_matmul(A_stack, B_stack):
+    # One batched call instead of a Python loop of np.dot calls
+    return np.matmul(A_stack, B_stack)
+
 @perf_timer
 def serial_matmul(matrices):
     results = []
 
-    for i in range(0,len(matrices),2):
+    for i in range(0,len(matrices) - 1,2):
         results.append(no_np_matmul(matrices[i], matrices[i+1]))
 
     return results
 
 @perf_timer
-def process_pool_np_matmul(matrices, num_procs):
-    pairs = [(matrices[i], matrices[i+1]) for i in range(0, len(matrices), 2)]
-    with multiprocessing.Pool(processes=num_procs) as pool:
-        results = pool.starmap(np.dot, pairs)
+def serial_nb_matmul(matrices):
+    results = []
+
+    for i in range(0,len(matrices) - 1,2):
+        results.append(nb_matmul(matrices[i], matrices[i+1]))
+
     return results
 
+# Shared-memory state for the process pool workers, so matrices aren't pickled per task
+GLOBAL_IN = None
+GLOBAL_OUT = None
+# Shared memory handles need to be global so they don't get GC'd
+shm_in = None
+shm_out = None
+
+def _init_shared_shm(name_in, shape_in, name_out, shape_out, dtype):
+    global GLOBAL_IN, GLOBAL_OUT, shm_in, shm_out
+    shm_in = shared_memory.SharedMemory(name=name_in)
+    shm_out = shared_memory.SharedMemory(name=name_out)
+    GLOBAL_IN = np.ndarray(shape_in, dtype=dtype, buffer=shm_in.buf)
+    GLOBAL_OUT = np.ndarray(shape_out, dtype=dtype, buffer=shm_out.buf)
+
+def _shared_np_worker(i):
+    np.dot(GLOBAL_IN[2*i], GLOBAL_IN[2*i+1], out=GLOBAL_OUT[i])
+
+def _shared_pure_worker(i):
+    GLOBAL_OUT[i] = no_np_matmul(GLOBAL_IN[2*i], GLOBAL_IN[2*i+1])
+
+def _shared_pool_matmul(matrices, num_procs, worker):
+    """Run worker(i) for every pair in a Pool, with inputs and outputs in shared memory."""
+    num_pairs = len(matrices) // 2
+    stack = np.stack(matrices[:2*num_pairs])
+    out_shape = (num_pairs,) + stack.shape[1:]
+
+    in_shm = shared_memory.SharedMemory(create=True, size=stack.nbytes)
+    out_shm = shared_memory.SharedMemory(create=True, size=stack.nbytes // 2)
+    try:
+        np.ndarray(stack.shape, dtype=stack.dtype, buffer=in_shm.buf)[:] = stack
+
+        init_args = (in_shm.name, stack.shape, out_shm.name, out_shape, stack.dtype)
+        with multiprocessing.Pool(processes=num_procs, initializer=_init_shared_shm, initargs=init_args) as pool:
+            pool.map(worker, range(num_pairs))
+
+        results = np.ndarray(out_shape, dtype=stack.dtype, buffer=out_shm.buf).copy()
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+
+    return results
+
+@perf_timer
+def process_pool_np_matmul(matrices, num_procs):
+    return _shared_pool_matmul(matrices, num_procs, _shared_np_worker)
+
 @perf_timer
 def process_pool_matmul(matrices, num_procs):
-    pairs = [(matrices[i], matrices[i+1]) for i in range(0, len(matrices), 2)]
-    with multiprocessing.Pool(processes=num_procs) as pool:
-        results = pool.starmap(no_np_matmul, pairs)
-    return results
+    return _shared_pool_matmul(matrices, num_procs, _shared_pure_worker)
 
 def no_np_matmul(A, B):
 
-    # Assume square matrices of same size
     rows = len(A)
-    cols = len(A[0])
+    inner = len(B)
+    cols = len(B[0])
 
-    result = [[0 for _ in range(cols)] for _ in range(rows)]
+    # Flat arrays of C doubles instead of lists of lists. B is stored
+    # transposed so the inner loop walks both operands contiguously.
+    Af = array.array('d', [x for row in A for x in row])
+    Bt = array.array('d', [B[k][j] for j in range(cols) for k in range(inner)])
+    result = array.array('d', bytes(8 * rows * cols))
 
     for i in range(rows):
+        base_a = i * inner
         for j in range(cols):
-            for k in range(cols):
-                result[i][j] += A[i][k] * B[k][j]
+            base_b = j * inner
+            s = 0.0
+            for k in range(inner):
+                s += Af[base_a + k] * Bt[base_b + k]
+            result[i * cols + j] = s
+
+    return [result[i * cols:(i + 1) * cols].tolist() for i in range(rows)]
+
+def _nb_matmul_kernel(A, B):
+    rows, K = A.shape
+    cols = B.shape[1]
+
+    C = np.zeros((rows, cols))
 
-    return result
+    # i-k-j order so the inner loop streams through contiguous rows of B
+    for i in prange(rows):
+        for k in range(K):
+            aik = A[i, k]
+            for j in range(cols):
+                C[i, j] += aik * B[k, j]
 
-def check_res(res, matrices):
+    return C
 
-    for i in range(0,len(matrices),2):
-        expected = np.dot(matrices[i], matrices[i+1])
+if njit is not None:
+    # parallel=True spreads the rows over Numba's own thread pool. That pool
+    # can't be entered from several Python threads at once, so the threaded
+    # benchmark uses a single-threaded build that releases the GIL instead.
+    # (Only one of the two can use cache=True, the cache key ignores flags.)
+    nb_matmul = njit(parallel=True, fastmath=True, cache=True)(_nb_matmul_kernel)
+    nb_matmul_nogil = njit(nogil=True, fastmath=True)(_nb_matmul_kernel)
+
+def check_res(res, stack):
+
+    for i in range(0,len(stack) - 1,2):
+        expected = np.dot(stack[i], stack[i+1])
         if not np.all(np.isclose(expected, res[i//2])):
             return False
 
@@ -129,39 +237,55 @@ if __name__ == "__main__":
     parser.add_argument("--num-matrices", type=int, default=20, help="Number of matrices to generate (default: 20)")
     parser.add_argument("--threads", type=int, default=5, help="Number of threads/processes (default: 5)")
     parser.add_argument("--mode", type=str, 
-                        choices=["threaded_np", "threaded", "serial_np", "serial", "process_np", "process", "all"],
+                        choices=["threaded_np", "threaded", "threaded_nb", "serial_np", "serial", "serial_nb",
+                                 "process_np", "process", "all"],
                         default="threaded_np",
                         help="Benchmark mode (default: threaded_np)")
     parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
     args = parser.parse_args()
 
-    np.random.seed(args.seed)
-
     print("GIL is enabled: " + str(sys._is_gil_enabled()))
 
-    matrices = []
-    for _ in range(args.num_matrices):
-        matrices.append(np.random.rand(args.size, args.size))
+    # All matrices in one contiguous allocation; `matrices` holds views into it
+    rng = np.random.default_rng(args.seed)
+    stack = rng.random((args.num_matrices, args.size, args.size))
+    matrices = list(stack)
+
+    # (N, size, size) stacks of the left and right operand of each pair
+    num_pairs = len(matrices) // 2
+    A_stack = np.ascontiguousarray(stack[0:2*num_pairs:2])
+    B_stack = np.ascontiguousarray(stack[1:2*num_pairs:2])
 
     res = None
 
     if args.mode == "threaded_np" or args.mode == "all":
-        res = threaded_np_matmul(matrices, args.threads)
+        res = threaded_np_matmul(A_stack, B_stack, args.threads)
     if args.mode == "threaded" or args.mode == "all":
         res = threaded_matmul(matrices, args.threads)
+    if args.mode == "threaded_nb" or args.mode == "all":
+        if njit is None:
+            print("threaded_nb_matmul: skipped (numba is not installed)")
+        else:
+            res = threaded_nb_matmul(matrices, args.threads)
     if args.mode == "serial_np" or args.mode == "all":
-        res = serial_np_matmul(matrices)
+        res = serial_np_matmul(A_stack, B_stack)
     if args.mode == "serial" or args.mode == "all":
         res = serial_matmul(matrices)
+    if args.mode == "serial_nb" or args.mode == "all":
+        if njit is None:
+            print("serial_nb_matmul: skipped (numba is not installed)")
+        else:
+            res = serial_nb_matmul(matrices)
     if args.mode == "process_np" or args.mode == "all":
         res = process_pool_np_matmul(matrices, args.threads)
     if args.mode == "process" or args.mode == "all":
         res = process_pool_matmul(matrices, args.threads)
 
     if res is not None:
-        print(f"Check Res returned {check_res(res, matrices)}")
+        print(f"Check Res returned {check_res(res, stack)}")
 
-    # Results
+    # Results (measured before the NumPy modes were batched and the process
+    # pools moved to shared memory; re-measure before comparing new runs)
     # 10 random 100x100 matmul
     # Python 3.13t (GIL Disabled)
     # threaded_np_matmul, 5 threads: 0.0013 s
@@ -1,4 +1,12 @@
 import argparse
+import concurrent.futures
+import ctypes
+import functools
+import itertools
+import json
+import logging
+import os
+import subprocess
 import threading
 import time
 
@@ -8,10 +16,69 @@ import time
 # Shared counter
 counter = 0
 counter_lock = threading.Lock()
+counter_iter = itertools.count()
 
 # Track errors
 errors = 0
 
+# --format json: one JSON object per run through the "bench" logger, with
+# RUN_INFO (e.g. GIL status) merged into each
+OUTPUT_JSON = False
+RUN_INFO = {}
+log = logging.getLogger("bench")
+
+_POOLS = {}
+
+def _get_pool(num_threads):
+    """Return a ThreadPoolExecutor with num_threads workers, created on first use and reused.
+
+    A new pool is warmed up by running one task per worker that waits on a
+    barrier, so every worker thread exists before anything is timed.
+    """
+    pool = _POOLS.get(num_threads)
+    if pool is None:
+        pool = _POOLS[num_threads] = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+        barrier = threading.Barrier(num_threads)
+        list(pool.map(lambda _: barrier.wait(), range(num_threads)))
+    return pool
+
+_SYNC_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_sync.c")
+_SYNC_LIB = os.path.splitext(_SYNC_SRC)[0] + ".so"
+
+def _load_sync_lib():
+    """Build _sync.c with the system C compiler if needed and load it. Return None on failure."""
+    try:
+        if not os.path.exists(_SYNC_LIB) or os.path.getmtime(_SYNC_LIB) < os.path.getmtime(_SYNC_SRC):
+            cc = os.environ.get("CC", "cc")
+            subprocess.run([cc, "-O2", "-shared", "-fPIC", "-o", _SYNC_LIB, _SYNC_SRC],
+                           check=True, capture_output=True)
+        lib = ctypes.CDLL(_SYNC_LIB)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    lib.counter_get.restype = ctypes.c_int64
+    lib.counter_incr.argtypes = [ctypes.c_int64]
+    lib.fastlock_acquire.argtypes = [ctypes.POINTER(ctypes.c_uint32)]
+    lib.fastlock_release.argtypes = [ctypes.POINTER(ctypes.c_uint32)]
+    return lib
+
+class FastLock:
+    """Spin-then-park lock from _sync.c, usable in a with statement like threading.Lock"""
+
+    def __init__(self, lib):
+        self._state = ctypes.c_uint32(0)
+        self._ptr = ctypes.pointer(self._state)
+        self._acquire = lib.fastlock_acquire
+        self._release = lib.fastlock_release
+
+    def __enter__(self):
+        self._acquire(self._ptr)
+
+    def __exit__(self, *exc):
+        self._release(self._ptr)
+
+# Loaded in main when a native mode is requested
+sync_lib = None
+
 def unsafe_incr(n):
     """Increment without lock (race condition)"""
     global counter, errors
@@ -26,72 +93,96 @@ def unsafe_incr(n):
 def get_one():
     return 1
     
-def safe_incr(n):
-    """Increment with lock (thread safe)"""
+def safe_incr(n, batch=1):
+    """Increment with lock (thread safe), adding batch at a time per lock acquisition"""
     global counter
-    for _ in range(n):
+    full, rem = divmod(n, batch)
+    for _ in range(full):
+        with counter_lock:
+            counter += batch
+    if rem:
         with counter_lock:
-            counter += 1
+            counter += rem
 
-def test_unsafe(num_threads, increments_per_thread):
-    """Test without synchronization"""
+def atomic_incr(n):
+    """Increment the native counter with an atomic add (thread safe, no lock)"""
+    sync_lib.counter_incr(n)
+
+def itercount_incr(n):
+    """Increment by advancing a shared itertools.count (no Python-level lock)"""
+    c = counter_iter
+    for _ in range(n):
+        next(c)
+
+def _run_counter_test(mode, incr, num_threads, increments_per_thread, read_counter=None, **info):
+    """Run incr(increments_per_thread) on num_threads pool threads and report lost increments
+
+    read_counter returns the final count for counters that don't live in
+    the global counter. info is extra settings to show with the results.
+    """
     global counter, errors
-    counter = 0
     errors = 0
+    expected = num_threads * increments_per_thread
 
-    print(f"\n--- UNSAFE MODE ---")
-    print(f"Threads: {num_threads}, Increments per thread: {increments_per_thread}")
-    print(f"Expected final value: {num_threads * increments_per_thread}")
+    if not OUTPUT_JSON:
+        settings = ", ".join(f"{k}={v}" for k, v in info.items())
+        print(f"\n--- {mode.upper()} MODE{f' ({settings})' if settings else ''} ---")
+        print(f"Threads: {num_threads}, Increments per thread: {increments_per_thread}")
+        print(f"Expected final value: {expected}")
 
-    threads = []
+    pool = _get_pool(num_threads)
     start = time.time()
 
-    for _ in range(num_threads):
-        t = threading.Thread(target=unsafe_incr, args=(increments_per_thread,))
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
+    list(pool.map(incr, [increments_per_thread] * num_threads))
 
     elapsed = time.time() - start
-    expected = num_threads * increments_per_thread
+    if read_counter is not None:
+        counter = read_counter()
     errors = expected - counter
 
+    if OUTPUT_JSON:
+        log.info(json.dumps({
+            "mode": mode, **info, **RUN_INFO, "threads": num_threads,
+            "increments_per_thread": increments_per_thread, "expected": expected,
+            "actual": counter, "errors": errors, "elapsed_s": elapsed,
+        }))
+        return
+
     print(f"Actual final value: {counter}")
     print(f"Lost increments: {errors}")
     print(f"Error rate: {(errors/expected)*100:.2f}%")
     print(f"Time: {elapsed:.4f}s")
 
-def test_safe(num_threads, increments_per_thread):
-    """Test with synchronization"""
-    global counter, errors
+def test_unsafe(num_threads, increments_per_thread):
+    """Test without synchronization"""
+    global counter
     counter = 0
-    errors = 0
-
-    print(f"\n--- SAFE MODE ---")
-    print(f"Threads: {num_threads}, Increments per thread: {increments_per_thread}")
-    print(f"Expected final value: {num_threads * increments_per_thread}")
-
-    threads = []
-    start = time.time()
+    _run_counter_test("unsafe", unsafe_incr, num_threads, increments_per_thread)
 
-    for _ in range(num_threads):
-        t = threading.Thread(target=safe_incr, args=(increments_per_thread,))
-        threads.append(t)
-        t.start()
+def test_safe(num_threads, increments_per_thread, batch=1):
+    """Test with synchronization"""
+    global counter
+    counter = 0
+    lock = "fast" if isinstance(counter_lock, FastLock) else "std"
+    _run_counter_test("safe", functools.partial(safe_incr, batch=batch), num_threads,
+                      increments_per_thread, lock=lock, batch=batch)
 
-    for t in threads:
-        t.join()
+def test_atomic(num_threads, increments_per_thread):
+    """Test with the native atomic counter"""
+    sync_lib.counter_reset()
+    _run_counter_test("atomic", atomic_incr, num_threads, increments_per_thread,
+                      read_counter=sync_lib.counter_get)
 
-    elapsed = time.time() - start
-    expected = num_threads * increments_per_thread
-    errors = expected - counter
+def test_itercount(num_threads, increments_per_thread):
+    """Test with itertools.count as the counter
 
-    print(f"Actual final value: {counter}")
-    print(f"Lost increments: {errors}")
-    print(f"Error rate: {(errors/expected)*100:.2f}%")
-    print(f"Time: {elapsed:.4f}s")
+    This measures how an atomic-style counter scales rather than a lock.
+    The final value is read by taking one more item from the count.
+    """
+    global counter_iter
+    counter_iter = itertools.count()
+    _run_counter_test("itercount", itercount_incr, num_threads, increments_per_thread,
+                      read_counter=lambda: next(counter_iter))
 
 
 if __name__ == "__main__":
@@ -104,11 +195,15 @@ if __name__ == "__main__":
   python mem_safety.py --threads 10 --increments 1000
   python mem_safety.py --mode unsafe --threads 5 --increments 2000
   python mem_safety.py --mode safe --threads 8
+  python mem_safety.py --mode safe --lock fast --threads 8
 
 This benchmark tests thread-safe vs unsafe counter increments:
   - unsafe: Increment without lock (demonstrates race conditions with GIL disabled)
   - safe:   Increment with lock (thread-safe, no lost increments)
-  - both:   Run both tests for comparison (default)
+  - atomic: Increment a native counter with atomic adds (needs a C compiler)
+  - itercount: Count by calling next() on a shared itertools.count
+  - both:   Run unsafe and safe for comparison (default)
+  - all:    Run all of the above
 
 Run with Python 3.13t and GIL disabled to observe race conditions:
   python3.13t -X gil=0 mem_safety.py --mode unsafe
@@ -118,9 +213,18 @@ Run with Python 3.13t and GIL disabled to observe race conditions:
                         help="Number of threads (default: 10)")
     parser.add_argument("--increments", type=int, default=1000,
                         help="Increments per thread (default: 1000)")
-    parser.add_argument("--mode", type=str, choices=["unsafe", "safe", "both"], default="both",
+    parser.add_argument("--batch", type=int, default=1,
+                        help="Increments added per lock acquisition in safe mode (default: 1)")
+    parser.add_argument("--lock", type=str, choices=["std", "fast"], default="std",
+                        help="Lock used by safe mode: threading.Lock or the spin-then-park "
+                             "lock from _sync.c (default: std)")
+    parser.add_argument("--format", type=str, choices=["text", "json"], default="text",
+                        help="Output: readable text, or one JSON line per run (default: text)")
+    parser.add_argument("--mode", type=str, choices=["unsafe", "safe", "atomic", "itercount", "both", "all"], default="both",
                         help="Test mode (default: both)")
     args = parser.parse_args()
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
 
     # Check GIL status
     try:
@@ -131,13 +235,36 @@ Run with Python 3.13t and GIL disabled to observe race conditions:
     except:
         gil_status = "ENABLED"
 
-    print(f"GIL: {gil_status}")
+    if args.format == "json":
+        OUTPUT_JSON = True
+        RUN_INFO["gil"] = gil_status
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+    else:
+        print(f"GIL: {gil_status}")
+
+    if args.lock == "fast":
+        sync_lib = _load_sync_lib()
+        if sync_lib is None:
+            print("--lock fast ignored: could not build _sync.c, using threading.Lock")
+        else:
+            counter_lock = FastLock(sync_lib)
 
     # Run tests
-    if args.mode in ("unsafe", "both"):
+    if args.mode in ("unsafe", "both", "all"):
         test_unsafe(args.threads, args.increments)
-    if args.mode in ("safe", "both"):
-        test_safe(args.threads, args.increments)
+    if args.mode in ("safe", "both", "all"):
+        test_safe(args.threads, args.increments, args.batch)
+    if args.mode in ("atomic", "all"):
+        sync_lib = sync_lib or _load_sync_lib()
+        if sync_lib is None:
+            print("\n--- ATOMIC MODE ---\nskipped (could not build _sync.c, is a C compiler installed?)")
+        else:
+            test_atomic(args.threads, args.increments)
+    if args.mode in ("itercount", "all"):
+        test_itercount(args.threads, args.increments)
 
     # Results (Probably need to run multiple times to see variability)
     # Python 3.13t (GIL Disabled)
@@ -1,4 +1,5 @@
 import argparse
+import array
 import psutil
 import os
 import threading
@@ -6,31 +7,75 @@ import time
 import sys
 import json
 
+import numpy as np
+
 
 class MemTracker:
     def __init__(self):
         self.process = psutil.Process(os.getpid())
         self.samples = []
+        self._stop = threading.Event()
+        # Read /proc/self/statm directly when we can: one pread per sample,
+        # instead of psutil reopening and parsing it into a namedtuple
+        try:
+            self._statm_fd = os.open("/proc/self/statm", os.O_RDONLY)
+        except OSError:
+            self._statm_fd = None
+        self._page_mb = os.sysconf("SC_PAGE_SIZE") / 1024**2 if self._statm_fd is not None else 0
+
+    def stop(self):
+        """Make a running track() return after its current sample"""
+        self._stop.set()
+
+    def close(self):
+        if self._statm_fd is not None:
+            os.close(self._statm_fd)
+            self._statm_fd = None
+
+    def _read_mem(self):
+        """Return (rss_mb, vss_mb)"""
+        if self._statm_fd is not None:
+            fields = os.pread(self._statm_fd, 128, 0).split()
+            return int(fields[1]) * self._page_mb, int(fields[0]) * self._page_mb
+        mem = self.process.memory_info()
+        return mem.rss / 1024**2, mem.vms / 1024**2
 
     def get_curr_mem(self):
         """Get current memory stats"""
-        mem = self.process.memory_info()
+        rss_mb, vss_mb = self._read_mem()
         return {
-            "rss_mb": mem.rss / 1024**2,
-            "vss_mb": mem.vms / 1024**2,
+            "rss_mb": rss_mb,
+            "vss_mb": vss_mb,
             "timestamp": time.time(),
         }
 
     def track(self, duration, interval=0.1):
         """Track memory over time"""
-        start = time.time()
-        while time.time() - start < duration:
-            self.samples.append(self.get_curr_mem())
-            time.sleep(interval)
+        # Sample into preallocated arrays so the tracker doesn't add to the
+        # heap churn it is measuring; build the dicts once at the end
+        size = int(duration / interval) + 4
+        ts = array.array("d", bytes(8 * size))
+        rss = array.array("d", bytes(8 * size))
+        vss = array.array("d", bytes(8 * size))
+        n = 0
+        # Schedule samples against fixed deadlines so the period doesn't
+        # stretch by the cost of each sample
+        start = deadline = time.monotonic()
+        while not self._stop.is_set() and deadline - start < duration and n < size:
+            ts[n] = time.time()
+            rss[n], vss[n] = self._read_mem()
+            n += 1
+            deadline += interval
+            self._stop.wait(max(0.0, deadline - time.monotonic()))
+
+        self.ts, self.rss, self.vss = ts[:n], rss[:n], vss[:n]
+        self.samples = [
+            {"rss_mb": rss[i], "vss_mb": vss[i], "timestamp": ts[i]} for i in range(n)
+        ]
         return self.samples
 
 
-def test_thread_local_mem(num_threads):
+def test_thread_local_mem(num_threads, trace=False, warmup=False):
     """Each thread allocates its own large data structure"""
     """
     Hypothesis: 
@@ -80,31 +125,82 @@ def test_thread_local_mem(num_threads):
     }
     """
 
-    import tracemalloc
-
     def memory_intensive_task():
         # Your workload here
         data = [list(range(10000)) for _ in range(100)]
         # Process data...
 
-    tracemalloc.start()
-    snapshot_before = tracemalloc.take_snapshot()
+    if trace:
+        # Per-line allocation diff, for tracking down leaks. tracemalloc hooks
+        # every allocation, so don't use these numbers for overhead
+        import tracemalloc
+
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+
+        threads = [threading.Thread(target=memory_intensive_task) for _ in range(num_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        snapshot_after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        top_stats = snapshot_after.compare_to(snapshot_before, "lineno")
+        for stat in top_stats[:10]:
+            print(stat)
+        return None
+
+    tracker = MemTracker()
+
+    if warmup:
+        # Let every worker start and make a first small allocation (so the
+        # allocator sets up its per-thread heap), then take the baseline
+        # once they are all waiting, and release them together
+        barrier = threading.Barrier(num_threads + 1)
+
+        def task():
+            warm = [[0] * 100 for _ in range(10)]
+            del warm
+            barrier.wait()
+            barrier.wait()
+            memory_intensive_task()
+    else:
+        task = memory_intensive_task
+
+    threads = [threading.Thread(target=task) for _ in range(num_threads)]
+    if warmup:
+        for t in threads:
+            t.start()
+        barrier.wait()
+        baseline = tracker.get_curr_mem()["rss_mb"]
+        barrier.wait()
+    else:
+        baseline = tracker.get_curr_mem()["rss_mb"]
+        for t in threads:
+            t.start()
+
+    # Poll RSS every 10 ms while the workers run to catch the peak
+    peak = baseline
+    while any(t.is_alive() for t in threads):
+        peak = max(peak, tracker.get_curr_mem()["rss_mb"])
+        time.sleep(0.01)
 
-    threads = [threading.Thread(target=memory_intensive_task) for _ in range(8)]
-    for t in threads:
-        t.start()
     for t in threads:
         t.join()
+    tracker.close()
 
-    snapshot_after = tracemalloc.take_snapshot()
-
-    top_stats = snapshot_after.compare_to(snapshot_before, "lineno")
-    for stat in top_stats[:10]:
-        print(stat)
+    return {
+        "baseline_mb": baseline,
+        "peak_mb": peak,
+        "overhead_mb": peak - baseline,
+        "per_thread_mb": (peak - baseline) / num_threads,
+    }
 
 
-def test_shared_mem(num_threads):
-    """All threads share one large data structure"""
+def test_shared_mem(num_threads, layout="list"):
+    """All threads share one large data structure (a list, or a numpy array with layout="numpy")"""
 
     """
     Hypothesis:
@@ -120,11 +216,27 @@ def test_shared_mem(num_threads):
     """
 
     # Single shared 50MB array
-    shared_data = [0] * (50 * 1024 * 1024 // 8)
-
-    def access_shared():
-        for i in range(1000000):
-            _ = shared_data[i % len(shared_data)]
+    if layout == "numpy":
+        # Packed int64 values read with one vectorized gather per thread, so
+        # reads don't go through the list's per-object lock
+        shared_data = np.empty(50 * 1024 * 1024 // 8, dtype=np.int64)
+        shared_data.fill(0)  # touch every page, like the list does, so it's in the baseline
+        indices = np.arange(1000000, dtype=np.int64) % shared_data.size
+
+        def access_shared():
+            _ = shared_data.take(indices)
+    else:
+        shared_data = [0] * (50 * 1024 * 1024 // 8)
+
+        def access_shared():
+            # Read the length once; on the free-threaded build each len()
+            # takes the list's lock, and the length never changes here
+            data = shared_data
+            n = len(data)
+            s = 0
+            for i in range(1000000):
+                s ^= data[i % n]
+            return s
 
     tracker = MemTracker()
     baseline = tracker.get_curr_mem()["rss_mb"]
@@ -139,11 +251,26 @@ def test_shared_mem(num_threads):
 
     for t in threads:
         t.join()
+    tracker.close()
 
     return {"baseline_mb": baseline, "peak_mb": peak, "overhead_mb": peak - baseline}
 
 
-def test_fragmentation(num_threads, duration=10):
+# Each fragmentation cycle allocates and frees FRAG_BLOCKS blocks of
+# 100 8-byte values. "list" is the original workload; "bytearray" and
+# "numpy" hit the allocator with one raw buffer per block instead of a
+# list header plus 100 int pointers
+FRAG_BLOCKS = 10000
+FRAG_BLOCK_ITEMS = 100
+
+BLOCK_ALLOCATORS = {
+    "list": lambda: [0] * FRAG_BLOCK_ITEMS,
+    "bytearray": lambda: bytearray(8 * FRAG_BLOCK_ITEMS),
+    "numpy": lambda: np.empty(FRAG_BLOCK_ITEMS, dtype=np.int64),
+}
+
+
+def test_fragmentation(num_threads, duration=10, alloc="list", interval=0.1):
     """
     Track memory patterns to detect fragmentation
     Threads continuously allocate and deallocate memory over a certain duration of time.
@@ -151,7 +278,9 @@ def test_fragmentation(num_threads, duration=10):
     By forcing mem allocator to handle high churns (constant creation and deletion of objects),
     we can observe possible differences in memory overhead with GIL on and off.
 
-    Use flag visual==True to generate visuals using gil on and off json files
+    Use flag visual==True to generate visuals using gil on and off result files
+
+    alloc picks the block type from BLOCK_ALLOCATORS.
 
     Results: Once again, the memory overhead is similar with both GIL on and off.
     However, with GIL off, performance gain is substantial, with 3.7x faster with aggressive allocation testing.
@@ -159,18 +288,21 @@ def test_fragmentation(num_threads, duration=10):
 
     """
 
-    def allocate_and_free():
-        while not stop_flag:
-            data = []
-            for _ in range(10000):
-                data.append([0] * 100)
-            del data
+    new_block = BLOCK_ALLOCATORS[alloc]
 
-    stop_flag = False
+    def allocate_and_free():
+        blocks = [None] * FRAG_BLOCKS
+        while not stop.is_set():
+            for i in range(FRAG_BLOCKS):
+                blocks[i] = new_block()
+            for i in range(FRAG_BLOCKS):
+                blocks[i] = None
+
+    stop = threading.Event()
     tracker = MemTracker()
 
     # Start tracking in background
-    track_thread = threading.Thread(target=lambda: tracker.track(duration))
+    track_thread = threading.Thread(target=lambda: tracker.track(duration, interval))
     track_thread.start()
 
     # Start worker threads
@@ -178,14 +310,35 @@ def test_fragmentation(num_threads, duration=10):
     for t in threads:
         t.start()
 
-    time.sleep(duration)
-    stop_flag = True
+    stop.wait(duration)
+    stop.set()
+    tracker.stop()
 
     for t in threads:
         t.join()
     track_thread.join()
+    tracker.close()
+
+    # Columnar, so save_res and visualize can work on arrays directly
+    return {
+        "timestamp": np.asarray(tracker.ts),
+        "rss_mb": np.asarray(tracker.rss),
+        "vss_mb": np.asarray(tracker.vss),
+    }
 
-    return tracker.samples
+
+def _load_series(output_dir, file_name):
+    """Return (times, rss) arrays from a saved .npz, or the older .json format"""
+    path = os.path.join(output_dir, f"{file_name}.npz")
+    if os.path.exists(path):
+        with np.load(path) as d:
+            ts, rss = d["timestamp"], d["rss_mb"]
+    else:
+        with open(os.path.join(output_dir, f"{file_name}.json"), "r") as f:
+            samples = json.load(f)["results"]
+        ts = np.array([s["timestamp"] for s in samples])
+        rss = np.array([s["rss_mb"] for s in samples])
+    return ts - ts[0], rss
 
 
 def visualize():
@@ -194,19 +347,8 @@ def visualize():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_dir = os.path.join(script_dir, "../membench_results")
 
-    with open(os.path.join(output_dir, f"mem_frag_DISABLED.json"), "r") as f:
-        samples1 = json.load(f)
-    with open(os.path.join(output_dir, f"mem_frag_ENABLED.json"), "r") as f:
-        samples2 = json.load(f)
-
-    samples1 = samples1["results"]
-    samples2 = samples2["results"]
-
-    times_off = [s["timestamp"] - samples1[0]["timestamp"] for s in samples1]
-    rss_off = [s["rss_mb"] for s in samples1]
-
-    times_on = [s["timestamp"] - samples2[0]["timestamp"] for s in samples2]
-    rss_on = [s["rss_mb"] for s in samples2]
+    times_off, rss_off = _load_series(output_dir, "mem_frag_DISABLED")
+    times_on, rss_on = _load_series(output_dir, "mem_frag_ENABLED")
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
     fig.suptitle(
@@ -223,20 +365,18 @@ def visualize():
     ax1.legend(fontsize=11)
     ax1.grid(True, alpha=0.3)
 
-    import statistics
-
     stats_on = {
-        "min": min(rss_on),
-        "max": max(rss_on),
-        "avg": statistics.mean(rss_on),
-        "std": statistics.stdev(rss_on) if len(rss_on) > 1 else 0,
+        "min": rss_on.min(),
+        "max": rss_on.max(),
+        "avg": rss_on.mean(),
+        "std": rss_on.std(ddof=1) if len(rss_on) > 1 else 0,
     }
 
     stats_off = {
-        "min": min(rss_off),
-        "max": max(rss_off),
-        "avg": statistics.mean(rss_off),
-        "std": statistics.stdev(rss_off) if len(rss_off) > 1 else 0,
+        "min": rss_off.min(),
+        "max": rss_off.max(),
+        "avg": rss_off.mean(),
+        "std": rss_off.std(ddof=1) if len(rss_off) > 1 else 0,
     }
 
     metrics = ["Min", "Max", "Average", "Std Dev"]
@@ -294,10 +434,16 @@ def visualize():
     plt.close()
 
 
-def save_res(results, file_name):
+def save_res(results, file_name, fmt="npz"):
+    """Save columnar results as compressed .npz, or as the older JSON list of samples"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     output_dir = os.path.join(script_dir, "../membench_results")
-    data = {"results": results}
+    if fmt == "npz":
+        np.savez_compressed(os.path.join(output_dir, f"{file_name}.npz"), **results)
+        return
+    keys = list(results)
+    rows = zip(*(results[k].tolist() for k in keys))
+    data = {"results": [dict(zip(keys, row)) for row in rows]}
     with open(os.path.join(output_dir, f"{file_name}.json"), "w") as f:
         json.dump(data, f, indent=2)
 
@@ -322,7 +468,8 @@ Available tests:
   
   fragmentation  - Threads continuously allocate/deallocate memory
                    Tests memory patterns and fragmentation over time
-                   Results are saved to JSON for later visualization
+                   Results are saved (.npz, or JSON with --format json)
+                   for later visualization
 """
     )
     parser.add_argument("--test", type=str, 
@@ -332,9 +479,23 @@ Available tests:
                         help="Number of threads (default: 8)")
     parser.add_argument("--duration", type=int, default=10,
                         help="Duration in seconds for fragmentation test (default: 10)")
+    parser.add_argument("--sample-hz", type=float, default=10,
+                        help="Memory samples per second for fragmentation test (default: 10)")
+    parser.add_argument("--alloc", type=str, choices=list(BLOCK_ALLOCATORS), default="list",
+                        help="Block type allocated by the fragmentation test (default: list)")
+    parser.add_argument("--layout", type=str, choices=["list", "numpy"], default="list",
+                        help="Shared data layout for the shared test (default: list)")
+    parser.add_argument("--format", type=str, choices=["npz", "json"], default="npz",
+                        help="File format for fragmentation results (default: npz)")
+    parser.add_argument("--trace", action="store_true",
+                        help="thread_local test: print a tracemalloc allocation diff instead of RSS overhead")
+    parser.add_argument("--warmup", action="store_true",
+                        help="thread_local test: start the threads and warm their heaps before the baseline")
     parser.add_argument("--visualize", action="store_true",
-                        help="Generate visualization from saved JSON results")
+                        help="Generate visualization from saved results")
     args = parser.parse_args()
+    if args.sample_hz <= 0:
+        parser.error("--sample-hz must be > 0")
 
     try:
         if hasattr(sys, "_is_gil_enabled"):
@@ -357,15 +518,16 @@ Available tests:
     print(f"Number of threads: {args.threads}")
 
     if args.test == "thread_local":
-        res = test_thread_local_mem(args.threads)
+        res = test_thread_local_mem(args.threads, trace=args.trace, warmup=args.warmup)
         print(res)
     elif args.test == "shared":
-        res = test_shared_mem(args.threads)
+        res = test_shared_mem(args.threads, layout=args.layout)
         print(res)
     elif args.test == "fragmentation":
         print(f"Duration: {args.duration}s")
-        res = test_fragmentation(args.threads, duration=args.duration)
-        save_res(res, f"mem_frag_{gil_status}")
+        res = test_fragmentation(args.threads, duration=args.duration, alloc=args.alloc,
+                                 interval=1 / args.sample_hz)
+        save_res(res, f"mem_frag_{gil_status}", fmt=args.format)
 
 
 if __name__ == "__main__":
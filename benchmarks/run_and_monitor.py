@@ -7,31 +7,145 @@ Usage:
 """
 
 import argparse
+import os
 import subprocess
 import sys
 import time
 
 import psutil
 
-def get_total_rss(proc):
-    """Return total RSS of proc + all children."""
+# Linux exposes each thread's direct children in /proc/<pid>/task/<tid>/children
+HAVE_PROC_CHILDREN = os.path.exists(f"/proc/self/task/{os.getpid()}/children")
+PAGESIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Parent cgroups whose memory controller _cgroup_create turned on, to turn off again
+_CGROUP_ENABLED_MEMORY = set()
+
+
+def _cgroup_create():
+    """Create a cgroup v2 child of our own cgroup that tracks memory.peak.
+
+    Returns its path, or None when cgroup v2 isn't mounted, we can't write to
+    our cgroup, or the memory controller can't be enabled for children (it
+    can't while our cgroup has processes in it, unless it is the root).
+    """
     try:
-        p = psutil.Process(proc.pid)
-    except psutil.NoSuchProcess:
+        with open("/proc/self/cgroup") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    if len(lines) != 1 or not lines[0].startswith("0::"):
+        return None
+
+    parent = CGROUP_ROOT + lines[0][3:].rstrip("/")
+    path = f"{parent}/run_and_monitor-{os.getpid()}"
+    control = f"{parent}/cgroup.subtree_control"
+    try:
+        with open(control) as f:
+            enabled = "memory" in f.read().split()
+        if not enabled:
+            with open(control, "w") as f:
+                f.write("+memory")
+            _CGROUP_ENABLED_MEMORY.add(parent)
+        os.mkdir(path)
+    except OSError:
+        _cgroup_restore(parent)
+        return None
+    if not os.path.exists(f"{path}/memory.peak"):
+        # memory.peak needs Linux 5.19
+        _cgroup_remove(path)
+        return None
+    return path
+
+
+def _cgroup_restore(parent):
+    """Turn the memory controller back off for parent's children if we turned it on"""
+    if parent in _CGROUP_ENABLED_MEMORY:
+        _CGROUP_ENABLED_MEMORY.discard(parent)
+        try:
+            with open(f"{parent}/cgroup.subtree_control", "w") as f:
+                f.write("-memory")
+        except OSError:
+            # Another child cgroup still uses it
+            pass
+
+
+def _cgroup_remove(path):
+    """Remove the cgroup at path and undo any change _cgroup_create made to its parent"""
+    try:
+        os.rmdir(path)
+    except OSError:
+        # A daemonized descendant is still running in it
+        return
+    _cgroup_restore(os.path.dirname(path))
+
+
+def _cgroup_peak(path):
+    """Read the peak memory of the cgroup at path"""
+    with open(f"{path}/memory.peak", "rb") as f:
+        return int(f.read())
+
+
+def _descendant_pids(pid):
+    """Return the pids of all descendants of pid, read from /proc"""
+    pids = []
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            tids = os.listdir(f"/proc/{p}/task")
+        except OSError:
+            continue
+        for tid in tids:
+            try:
+                with open(f"/proc/{p}/task/{tid}/children", "rb") as f:
+                    kids = [int(c) for c in f.read().split()]
+            except OSError:
+                continue
+            pids.extend(kids)
+            stack.extend(kids)
+    return pids
+
+
+def _statm_rss(pid):
+    """Return the RSS of pid in bytes from /proc/<pid>/statm, or 0 if it has exited"""
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGESIZE
+    except (OSError, IndexError, ValueError):
         return 0
 
-    total = 0
+
+def get_total_rss(proc, handles):
+    """Return total RSS of proc + all children.
+
+    Off Linux, handles maps pid -> psutil.Process and is reused between
+    calls, so each sample doesn't rebuild a Process object per descendant.
+    """
+    if HAVE_PROC_CHILDREN:
+        # A few small reads under /proc/<pid>, instead of psutil scanning
+        # every process on the system for its parent pid
+        return sum(_statm_rss(pid) for pid in [proc.pid] + _descendant_pids(proc.pid))
 
     try:
-        total += p.memory_info().rss
-    except psutil.Error:
-        pass
+        root = handles.get(proc.pid) or psutil.Process(proc.pid)
+        pids = [proc.pid] + [c.pid for c in root.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return 0
 
-    for child in p.children(recursive=True):
+    total = 0
+
+    for pid in pids:
         try:
-            total += child.memory_info().rss
+            p = handles.get(pid)
+            if p is None:
+                p = handles[pid] = psutil.Process(pid)
+            total += p.memory_info().rss
         except psutil.Error:
-            pass
+            handles.pop(pid, None)
+
+    for pid in handles.keys() - set(pids):
+        del handles[pid]
 
     return total
 
@@ -43,13 +157,24 @@ def main():
   python run_and_monitor.py python3 your_script.py arg1 arg2
   python run_and_monitor.py --interval 0.05 python3 heavy_computation.py
   python run_and_monitor.py --verbose python3 benchmarks/matmul.py --threads 8
+  python run_and_monitor.py --cgroup python3 benchmarks/thread_overhead.py --selected 4
 
 The tool spawns the given command, samples memory usage at regular intervals,
-and reports peak memory usage when the process finishes.""",
+and reports peak memory usage when the process finishes. With --cgroup the
+kernel's own peak for the command's cgroup is reported instead; it includes
+page cache and kernel memory charged to the command, not only RSS.""",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("--interval", type=float, default=0.1,
                         help="Memory sampling interval in seconds (default: 0.1)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Double the interval (up to --max-interval) while RSS is stable, "
+                             "and reset it when RSS changes by more than 5%%")
+    parser.add_argument("--max-interval", type=float, default=1.0,
+                        help="Longest sampling interval with --adaptive (default: 1.0)")
+    parser.add_argument("--cgroup", action="store_true",
+                        help="Run the command in its own cgroup v2 and report the kernel's memory.peak "
+                             "instead of sampling RSS (falls back to sampling when unavailable)")
     parser.add_argument("--verbose", action="store_true",
                         help="Print live memory usage during execution")
     parser.add_argument("command", nargs=argparse.REMAINDER,
@@ -63,11 +188,43 @@ and reports peak memory usage when the process finishes.""",
     # Command to execute (list of args)
     cmd = args.command
 
+    cgroup = None
+    if args.cgroup:
+        cgroup = _cgroup_create()
+        if cgroup is None:
+            print("cgroup v2 memory accounting is not available, sampling RSS instead")
+
+    if cgroup is not None:
+        def join_cgroup(procs=f"{cgroup}/cgroup.procs"):
+            # Runs in the child before exec, so every descendant is counted
+            with open(procs, "w") as f:
+                f.write("0")
+
+        print(f"Starting: {' '.join(cmd)}")
+        try:
+            proc = subprocess.Popen(cmd, preexec_fn=join_cgroup)
+            # The kernel tracks the peak; nothing to sample
+            proc.wait()
+            print("\nProcess finished.")
+            peak = _cgroup_peak(cgroup)
+        finally:
+            _cgroup_remove(cgroup)
+        print(f"Peak memory usage (cgroup memory.peak): {peak / (1024*1024):.2f} MB")
+        return
+
     # Start target program
     print(f"Starting: {' '.join(cmd)}")
     proc = subprocess.Popen(cmd)
 
     peak = 0
+    handles = {}
+    samples = 0
+    interval = args.interval
+    prev = 0
+    stable = 0
+    # Sample against fixed deadlines so the period doesn't grow by the
+    # cost of each sample
+    deadline = time.monotonic()
 
     try:
         while True:
@@ -75,12 +232,31 @@ and reports peak memory usage when the process finishes.""",
             if proc.poll() is not None:
                 break
 
-            mem = get_total_rss(proc)
+            mem = get_total_rss(proc, handles)
+            samples += 1
             peak = max(peak, mem)
             if args.verbose:
                 print(f"RSS: {mem / (1024*1024):.2f} MB")
 
-            time.sleep(args.interval)  # sampling interval
+            if args.adaptive and prev:
+                # Back off while memory is flat, snap back on any real change
+                change = abs(mem - prev) / prev
+                if change > 0.05:
+                    interval = args.interval
+                    stable = 0
+                elif change < 0.01:
+                    stable += 1
+                    if stable == 3:
+                        interval = min(interval * 2, args.max_interval)
+                        stable = 0
+            prev = mem
+
+            deadline += interval
+            try:
+                # Returns as soon as the process exits
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                pass
     finally:
         # Ensure process is reaped in case of exceptions
         try:
@@ -90,6 +266,8 @@ and reports peak memory usage when the process finishes.""",
 
     print("\nProcess finished.")
     print(f"Peak memory usage: {peak / (1024*1024):.2f} MB")
+    if args.verbose:
+        print(f"Samples: {samples}")
 
 
 if __name__ == "__main__":
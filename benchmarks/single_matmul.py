@@ -1,18 +1,45 @@
 import argparse
+import atexit
+import functools
 import time
 import threading
 import multiprocessing
-from multiprocessing import shared_memory
+from multiprocessing import resource_tracker, shared_memory
 import random
 import math
+import operator
 import numpy as np
 import sys
 
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+try:
+    from numba import config as numba_config, njit, prange
+
+    # Same reason as matmul.py: TBB deadlocks at exit once fork pools have
+    # run after a parallel=True kernel
+    numba_config.THREADING_LAYER = "workqueue"
+except ImportError:
+    # Numba doesn't support the free-threaded build yet
+    njit = None
+    prange = range
+
+# --bench-fast: let the "pure" single-threaded baseline hand off to BLAS
+BENCH_FAST = False
+
+
+def perf_timer(func=None, *, warmup=True):
+    # Usable bare or as @perf_timer(warmup=False). BLAS and the interpreter
+    # loops have nothing to warm up; the process pools and numba do
+    if func is None:
+        return functools.partial(perf_timer, warmup=warmup)
 
-def perf_timer(func):
     def wrapper(*args, **kwargs):
-        # warmup
-        _ = func(*args, **kwargs)
+        if warmup:
+            _ = func(*args, **kwargs)
 
         times = []
         for _ in range(3):
@@ -27,13 +54,34 @@ def perf_timer(func):
     return wrapper
 
 
-@perf_timer
+@perf_timer(warmup=False)
 def single_thread_matmul(A, B):
     return np.dot(A, B)
 
 
-@perf_timer
-def single_thread_matmul_pure(A, B):
+if hasattr(math, "sumprod"):
+    _dot = math.sumprod
+else:
+    # math.sumprod is 3.12+
+    def _dot(a, b):
+        return sum(map(operator.mul, a, b))
+
+
+def _transpose(B):
+    return [list(col) for col in zip(*B)]
+
+
+@perf_timer(warmup=False)
+def single_thread_matmul_pure(A, B, kernel="loop"):
+    if BENCH_FAST:
+        # One O(n^2) conversion, then a single BLAS GEMM call
+        return (np.asarray(A, dtype=np.float64) @ np.asarray(B, dtype=np.float64)).tolist()
+
+    if kernel == "dot":
+        # Rows of A against columns of B, each dot product in one C call
+        Bt = _transpose(B)
+        return [[_dot(ai, bj) for bj in Bt] for ai in A]
+
     n = len(A)
     m = len(B[0])
     p = len(B)
@@ -52,14 +100,65 @@ def single_thread_matmul_pure(A, B):
     return R
 
 
-# The multithreaded worker computes R[start:end, :] = A[start:end, :] @ B
+def _nb_matmul_kernel(A, B, R, start, end):
+    # Rows start:end of R += A @ B, in i-k-j order like the pure version
+    p = A.shape[1]
+    m = B.shape[1]
+    for i in prange(start, end):
+        for k in range(p):
+            aik = A[i, k]
+            for j in range(m):
+                R[i, j] += aik * B[k, j]
+
+
+if njit is not None:
+    _NB_SIG = "void(f8[:,:], f8[:,:], f8[:,:], i8, i8)"
+    # prange splits the rows over Numba's own thread pool. That pool can't be
+    # entered from several Python threads at once, so the threaded variant
+    # uses a serial build that releases the GIL. Only one may use cache=True.
+    nb_matmul = njit(_NB_SIG, parallel=True, fastmath=True, cache=True)(_nb_matmul_kernel)
+    nb_matmul_nogil = njit(_NB_SIG, nogil=True, fastmath=True)(_nb_matmul_kernel)
+
+
+@perf_timer
+def single_thread_matmul_nb(A, B):
+    R = np.zeros((A.shape[0], B.shape[1]), dtype=np.float64)
+    nb_matmul(A, B, R, 0, A.shape[0])
+    return R
+
+
 @perf_timer
+def multithread_matmul_nb(A, B, num_threads=4):
+    n_rows = A.shape[0]
+    R = np.zeros((n_rows, B.shape[1]), dtype=np.float64)
+
+    chunk_size = (n_rows + num_threads - 1) // num_threads
+    threads = []
+    for i in range(num_threads):
+        start = i * chunk_size
+        if start >= n_rows:
+            break
+        end = min((i + 1) * chunk_size, n_rows)
+        t = threading.Thread(target=nb_matmul_nogil, args=(A, B, R, start, end))
+        threads.append(t)
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return R
+
+
+# The multithreaded worker computes R[start:end, :] = A[start:end, :] @ B
+@perf_timer(warmup=False)
 def multithread_matmul(A, B, num_threads=4):
     n_rows = A.shape[0]
     R = np.empty((n_rows, B.shape[1]), dtype=A.dtype)
 
     def worker(start, end):
-        R[start:end, :] = A[start:end, :].dot(B)
+        # Row slices of R are contiguous, so BLAS writes straight into them
+        np.dot(A[start:end, :], B, out=R[start:end, :])
 
     chunk_size = (n_rows + num_threads - 1) // num_threads
     threads = []
@@ -71,17 +170,25 @@ def multithread_matmul(A, B, num_threads=4):
         t = threading.Thread(target=worker, args=(start, end))
         threads.append(t)
 
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    # BLAS already threads each dot call; with one BLAS thread per shard the
+    # Python threads don't oversubscribe the cores. The limit is process-wide,
+    # so it wraps all the threads rather than each worker.
+    limits = threadpool_limits(limits=1, user_api="blas") if threadpool_limits is not None else None
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if limits is not None:
+            limits.restore_original_limits()
 
     return R
 
 
 # The multithreaded worker computes R[start:end, :] = A[start:end, :] @ B
-@perf_timer
-def multithread_matmul_pure(A, B, num_threads=4):
+@perf_timer(warmup=False)
+def multithread_matmul_pure(A, B, num_threads=4, tile=0, kernel="loop"):
     #  A and B are lists of lists.
     n = len(A)
     m = len(B[0])
@@ -99,6 +206,34 @@ def multithread_matmul_pure(A, B, num_threads=4):
                 for j in range(m):
                     ri[j] += aik * bk[j]
 
+    def tiled_worker(start, end):
+        # Same i-k-j loop over tile x tile blocks
+        for ii in range(start, end, tile):
+            ie = min(ii + tile, end)
+            for kk in range(0, p, tile):
+                ke = min(kk + tile, p)
+                for jj in range(0, m, tile):
+                    je = min(jj + tile, m)
+                    for i in range(ii, ie):
+                        ai = A[i]
+                        ri = R[i]
+                        for k in range(kk, ke):
+                            aik = ai[k]
+                            bk = B[k]
+                            for j in range(jj, je):
+                                ri[j] += aik * bk[j]
+
+    def dot_worker(start, end):
+        for i in range(start, end):
+            ai = A[i]
+            R[i] = [_dot(ai, bj) for bj in Bt]
+
+    if kernel == "dot":
+        Bt = _transpose(B)
+        target = dot_worker
+    else:
+        target = tiled_worker if tile > 0 else worker
+
     chunk_size = (n + num_threads - 1) // num_threads
     threads = []
     for t_idx in range(num_threads):
@@ -106,7 +241,7 @@ def multithread_matmul_pure(A, B, num_threads=4):
         if start >= n:
             break
         end = min((t_idx + 1) * chunk_size, n)
-        t = threading.Thread(target=worker, args=(start, end))
+        t = threading.Thread(target=target, args=(start, end))
         threads.append(t)
 
     for t in threads:
@@ -117,6 +252,30 @@ def multithread_matmul_pure(A, B, num_threads=4):
     return R
 
 
+# fork lets the workers start without re-importing this module; elsewhere fork
+# isn't safe with the BLAS/Accelerate threads, so keep the platform default
+_MP_CONTEXT = multiprocessing.get_context("fork" if sys.platform == "linux" else None)
+_PROC_POOLS = {}
+
+
+def _get_proc_pool(num_processes):
+    """Process pool reused across calls, so perf_timer's runs don't time pool startup."""
+    pool = _PROC_POOLS.get(num_processes)
+    if pool is None:
+        # Start the resource tracker first so the workers share it. Otherwise
+        # each one starts its own, never sees the parent unlink the shared
+        # memory blocks and warns about leaks at exit.
+        resource_tracker.ensure_running()
+        pool = _PROC_POOLS[num_processes] = _MP_CONTEXT.Pool(processes=num_processes)
+    return pool
+
+
+@atexit.register
+def _close_proc_pools():
+    for pool in _PROC_POOLS.values():
+        pool.terminate()
+
+
 def _proc_np_worker(a_slice, B, start):
     return (start, a_slice.dot(B))
 
@@ -149,8 +308,7 @@ def multiprocess_matmul(A, B, num_processes=4):
         end = min((i + 1) * chunk_size, n_rows)
         tasks.append((A[start:end, :], B, start))
 
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.starmap(_proc_np_worker, tasks)
+    results = _get_proc_pool(num_processes).starmap(_proc_np_worker, tasks)
 
     for start, chunk in results:
         R[start:start + chunk.shape[0], :] = chunk
@@ -172,8 +330,7 @@ def multiprocess_matmul_pure(A, B, num_processes=4):
         end = min((i + 1) * chunk_size, n)
         tasks.append((A[start:end], B, start))
 
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.starmap(_proc_pure_worker, tasks)
+    results = _get_proc_pool(num_processes).starmap(_proc_pure_worker, tasks)
 
     for start, chunk_rows in results:
         for i, row in enumerate(chunk_rows):
@@ -182,65 +339,84 @@ def multiprocess_matmul_pure(A, B, num_processes=4):
     return R
 
 
-# Shared-memory NumPy multiprocess implementation to avoid copying large A/B
+# Shared-memory NumPy multiprocess implementation to avoid copying large A/B/R
 GLOBAL_A = None
 GLOBAL_B = None
+GLOBAL_R = None
 # Shared memory handles need to be global so they don't get GC'd
 # https://stackoverflow.com/questions/79787708/python-multiprocessing-shared-memory-seems-to-hang-or-crash-when-interacting-wit
 shm_a = None
 shm_b = None
-
-
-def _init_shared_shm(name_a, shape_a, name_b, shape_b, dtype):
-    global GLOBAL_A, GLOBAL_B, shm_a, shm_b
+shm_r = None
+# Blocks the worker is attached to; the pool outlives each call's blocks
+_shm_names = None
+
+
+def _init_shared_shm(name_a, shape_a, name_b, shape_b, name_r, shape_r, dtype):
+    global GLOBAL_A, GLOBAL_B, GLOBAL_R, shm_a, shm_b, shm_r, _shm_names
+    # Drop the views before closing, an exported buffer can't be closed
+    GLOBAL_A = GLOBAL_B = GLOBAL_R = None
+    for shm in (shm_a, shm_b, shm_r):
+        if shm is not None:
+            shm.close()
+    _shm_names = (name_a, name_b, name_r)
     shm_a = shared_memory.SharedMemory(name=name_a)
     shm_b = shared_memory.SharedMemory(name=name_b)
+    shm_r = shared_memory.SharedMemory(name=name_r)
     GLOBAL_A = np.ndarray(shape_a, dtype=dtype, buffer=shm_a.buf)
     GLOBAL_B = np.ndarray(shape_b, dtype=dtype, buffer=shm_b.buf)
+    GLOBAL_R = np.ndarray(shape_r, dtype=dtype, buffer=shm_r.buf)
 
 
 def _shared_np_worker_range(args):
-    start, end = args
-    chunk = GLOBAL_A[start:end, :].dot(GLOBAL_B)
-    return (start, chunk)
+    # Write the rows straight into the shared output; nothing big goes back
+    start, end, init_args = args
+    if _shm_names != init_args[0:5:2]:
+        _init_shared_shm(*init_args)
+    np.dot(GLOBAL_A[start:end, :], GLOBAL_B, out=GLOBAL_R[start:end, :])
+    return start
 
 
 @perf_timer
 def multiprocess_matmul_shared(A, B, num_processes=4):
     n_rows = A.shape[0]
-    R = np.empty((n_rows, B.shape[1]), dtype=A.dtype)
+    r_shape = (n_rows, B.shape[1])
 
-    global shm_a, shm_b
-    # create shared memory blocks and copy A, B into them
+    global shm_a, shm_b, shm_r
+    # create shared memory blocks and copy A, B into them; unlink them
+    # whatever happens below so nothing is left behind in /dev/shm
     shm_a = shared_memory.SharedMemory(create=True, size=A.nbytes)
-    shm_b = shared_memory.SharedMemory(create=True, size=B.nbytes)
-
-    a_shm_arr = np.ndarray(A.shape, dtype=A.dtype, buffer=shm_a.buf)
-    b_shm_arr = np.ndarray(B.shape, dtype=B.dtype, buffer=shm_b.buf)
-
-    a_shm_arr[:] = A[:]
-    b_shm_arr[:] = B[:]
-
-    chunk_size = (n_rows + num_processes - 1) // num_processes
-    tasks = []
-    for i in range(num_processes):
-        start = i * chunk_size
-        if start >= n_rows:
-            break
-        end = min((i + 1) * chunk_size, n_rows)
-        tasks.append((start, end))
-
-    init_args = (shm_a.name, A.shape, shm_b.name, B.shape, A.dtype)
-    with multiprocessing.Pool(processes=num_processes, initializer=_init_shared_shm, initargs=init_args) as pool:
-        results = pool.map(_shared_np_worker_range, tasks)
-
-    for start, chunk in results:
-        R[start:start + chunk.shape[0], :] = chunk
-
-    shm_a.close()
-    shm_a.unlink()
-    shm_b.close()
-    shm_b.unlink()
+    shm_b = shm_r = None
+    try:
+        shm_b = shared_memory.SharedMemory(create=True, size=B.nbytes)
+        shm_r = shared_memory.SharedMemory(create=True, size=n_rows * B.shape[1] * A.itemsize)
+
+        a_shm_arr = np.ndarray(A.shape, dtype=A.dtype, buffer=shm_a.buf)
+        b_shm_arr = np.ndarray(B.shape, dtype=B.dtype, buffer=shm_b.buf)
+
+        a_shm_arr[:] = A[:]
+        b_shm_arr[:] = B[:]
+
+        # Workers attach to the blocks on their first task that names them
+        init_args = (shm_a.name, A.shape, shm_b.name, B.shape, shm_r.name, r_shape, A.dtype)
+        chunk_size = (n_rows + num_processes - 1) // num_processes
+        tasks = []
+        for i in range(num_processes):
+            start = i * chunk_size
+            if start >= n_rows:
+                break
+            end = min((i + 1) * chunk_size, n_rows)
+            tasks.append((start, end, init_args))
+
+        _get_proc_pool(num_processes).map(_shared_np_worker_range, tasks)
+
+        # Copy out before the block is unlinked
+        R = np.ndarray(r_shape, dtype=A.dtype, buffer=shm_r.buf).copy()
+    finally:
+        for shm in (shm_a, shm_b, shm_r):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
 
     return R
 
@@ -264,24 +440,43 @@ def main():
   python single_matmul.py --size 1000 --mode single_np
   python single_matmul.py --size 300 --impl pure --mode multi_thread --threads 4
   python single_matmul.py --impl numpy --mode multi_process_shared --threads 8
+  python single_matmul.py --size 500 --impl numba --mode all
 
 Modes for numpy implementation:
   single, multi_thread, multi_process, multi_process_shared, all
 
 Modes for pure Python implementation:
   single, multi_thread, multi_process, all
+
+Modes for numba implementation (single uses prange, multi_thread nogil threads):
+  single, multi_thread, all
 """
     )
     p.add_argument("--size", type=int, default=500, help="Matrix size n for n x n (default: 500)")
     p.add_argument("--threads", type=int, default=5, help="Number of worker threads/processes (default: 5)")
-    p.add_argument("--impl", choices=["numpy", "pure"], default="numpy",
-                   help="Implementation type: 'numpy' or 'pure' Python (default: numpy)")
+    p.add_argument("--impl", choices=["numpy", "pure", "numba"], default="numpy",
+                   help="Implementation type: 'numpy', 'pure' Python or 'numba' JIT (default: numpy)")
     p.add_argument("--mode", type=str, default="all",
                    choices=["single", "multi_thread", "multi_process", "multi_process_shared", "all"],
                    help="Which benchmark(s) to run (default: all)")
+    p.add_argument("--dtype", choices=["fp64", "fp32"], default="fp64",
+                   help="Element type for the numpy implementation (default: fp64)")
     p.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    p.add_argument("--kernel", choices=["loop", "dot"], default="loop",
+                   help="Pure single/multi_thread inner loop: 'loop' (i-k-j over list items) or 'dot' "
+                        "(transpose B, one math.sumprod per element) (default: loop)")
+    p.add_argument("--tile", type=int, default=0,
+                   help="Block size for cache tiling in the pure multi_thread run (default: 0, no tiling)")
+    p.add_argument("--bench-fast", action="store_true",
+                   help="Convert the pure-Python lists to NumPy and use BLAS in the single-threaded pure run")
     args = p.parse_args()
 
+    if args.tile < 0:
+        p.error("--tile must be >= 0")
+
+    global BENCH_FAST
+    BENCH_FAST = args.bench_fast
+
     n = args.size
 
     # Validate size for pure implementation
@@ -294,14 +489,43 @@ Modes for pure Python implementation:
         print("Error: 'multi_process_shared' mode is only available for numpy implementation.")
         sys.exit(1)
 
+    if args.impl == "numba":
+        if njit is None:
+            print("Error: numba is not installed.")
+            sys.exit(1)
+        if args.mode in ("multi_process", "multi_process_shared"):
+            print(f"Error: '{args.mode}' mode is not available for numba implementation.")
+            sys.exit(1)
+
     print(f"GIL is enabled: {sys._is_gil_enabled()}")
+    if args.impl != "numpy" and args.dtype != "fp64":
+        print(f"--dtype {args.dtype} ignored: the {args.impl} implementation uses fp64")
+
     print(f"Creating two {n}x{n} matrices ({args.impl} implementation)")
 
-    if args.impl == "numpy":
+    if args.impl == "numba":
         np.random.seed(args.seed)
         A = np.random.rand(n, n).astype(np.float64)
         B = np.random.rand(n, n).astype(np.float64)
 
+        results = {}
+
+        if args.mode in ("single", "all"):
+            results["single"] = single_thread_matmul_nb(A, B)
+
+        if args.mode in ("multi_thread", "all"):
+            results["multi_thread"] = multithread_matmul_nb(A, B, num_threads=args.threads)
+
+        R_ref = np.dot(A, B)
+        all_equal = all(np.allclose(R_ref, r, rtol=1e-5, atol=1e-8) for r in results.values())
+        print(f"All results equal: {all_equal}")
+
+    elif args.impl == "numpy":
+        dtype = np.float32 if args.dtype == "fp32" else np.float64
+        np.random.seed(args.seed)
+        A = np.random.rand(n, n).astype(dtype)
+        B = np.random.rand(n, n).astype(dtype)
+
         R_ref = None
         results = {}
 
@@ -310,6 +534,8 @@ Modes for pure Python implementation:
             results["single"] = R_ref
 
         if args.mode in ("multi_thread", "all"):
+            if threadpool_limits is None:
+                print("threadpoolctl is not installed, multi_thread shards use all BLAS threads")
             R = multithread_matmul(A, B, num_threads=args.threads)
             results["multi_thread"] = R
             if R_ref is None:
@@ -329,7 +555,9 @@ Modes for pure Python implementation:
 
         # Verify all results match
         if len(results) > 1 and R_ref is not None:
-            all_equal = all(np.allclose(R_ref, r, rtol=1e-5, atol=1e-8) for r in results.values())
+            # fp32 sums round differently depending on how the rows are split
+            rtol = 1e-4 if dtype == np.float32 else 1e-5
+            all_equal = all(np.allclose(R_ref, r, rtol=rtol, atol=1e-8) for r in results.values())
             print(f"All results equal: {all_equal}")
 
     else:  # pure Python
@@ -341,11 +569,11 @@ Modes for pure Python implementation:
         results = {}
 
         if args.mode in ("single", "all"):
-            R_ref = single_thread_matmul_pure(A, B)
+            R_ref = single_thread_matmul_pure(A, B, kernel=args.kernel)
             results["single"] = R_ref
 
         if args.mode in ("multi_thread", "all"):
-            R = multithread_matmul_pure(A, B, num_threads=args.threads)
+            R = multithread_matmul_pure(A, B, num_threads=args.threads, tile=args.tile, kernel=args.kernel)
             results["multi_thread"] = R
             if R_ref is None:
                 R_ref = R
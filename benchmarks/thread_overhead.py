@@ -1,49 +1,158 @@
 import time
 import threading
+import _thread
 import argparse
+import os
 import sys
 import tracemalloc
+import collections
 import concurrent.futures
+import ctypes
 import multiprocessing
+import queue
+import statistics
+import subprocess
+
+try:
+    from numba import config as numba_config, njit, prange, set_num_threads
+
+    # TBB deadlocks at exit once fork-based process pools have run after a
+    # parallel=True kernel; the built-in workqueue is enough here
+    numba_config.THREADING_LAYER = "workqueue"
+except ImportError:
+    # Numba doesn't support the free-threaded build yet
+    njit = None
 
 MEM_TRACK = False
+# --mem-mode: "rss" (peak RSS above the starting RSS, no allocation hooks) or "tracemalloc"
+MEM_MODE = "rss"
+# Timed runs per case (--samples)
+SAMPLES = 5
+# --pin-cpus: keep the run on a fixed CPU set, one CPU per ForkUnionPool worker
+PIN_CPUS = False
+# CPUs this process may run on, captured before anything gets pinned
+ALLOWED_CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+
+def _pin_to_cpu(idx):
+    """Pin the calling thread to the idx'th allowed CPU (wrapping around)."""
+    os.sched_setaffinity(0, {ALLOWED_CPUS[idx % len(ALLOWED_CPUS)]})
+# multiprocessing start method for the process benchmarks (None: platform default)
+START_METHOD = None
+_CTX = None
+
+def _get_context():
+    global _CTX
+    if _CTX is None:
+        _CTX = multiprocessing.get_context(START_METHOD)
+        if _CTX.get_start_method() == "forkserver":
+            # Import this module once in the server, not in every child
+            _CTX.set_forkserver_preload(["__main__"])
+    return _CTX
+
+# Native atomic counter shared with mem_safety.py (see _sync.c)
+_SYNC_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_sync.c")
+_SYNC_LIB = os.path.splitext(_SYNC_SRC)[0] + ".so"
+
+def _load_sync_lib():
+    """Build _sync.c with the system C compiler if needed and load it. Return None on failure."""
+    try:
+        if not os.path.exists(_SYNC_LIB) or os.path.getmtime(_SYNC_LIB) < os.path.getmtime(_SYNC_SRC):
+            cc = os.environ.get("CC", "cc")
+            subprocess.run([cc, "-O2", "-shared", "-fPIC", "-o", _SYNC_LIB, _SYNC_SRC],
+                           check=True, capture_output=True)
+        lib = ctypes.CDLL(_SYNC_LIB)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    lib.counter_get.restype = ctypes.c_int64
+    lib.counter_incr.argtypes = [ctypes.c_int64]
+    return lib
+
+# Loaded in run_sweep when batched_creation_spin is selected
+sync_lib = None
+
+def fmt_bytes(n):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024.0:
+            return f"{n:3.1f}{unit}"
+        n /= 1024.0
+    return f"{n:.1f}GiB"
+
+def _reset_peak_rss():
+    """Reset this process's peak RSS (VmHWM) to its current RSS. Return False where unsupported.
+
+    ru_maxrss can't be reset, so after the warmup it would no longer move
+    and every sample would show zero growth.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _rss_status():
+    """Return (current RSS, peak RSS since the last reset) in bytes, from /proc/self/status."""
+    rss = hwm = 0
+    with open("/proc/self/status", "rb") as f:
+        for line in f:
+            if line.startswith(b"VmRSS:"):
+                rss = int(line.split()[1]) * 1024
+            elif line.startswith(b"VmHWM:"):
+                hwm = int(line.split()[1]) * 1024
+    return rss, hwm
 
 def perf_timer(func):
-    def wrapper(*args, **kwargs):
-        # warmup
-        _ = func(*args, **kwargs)
-
-        def fmt_bytes(n):
-            for unit in ("B", "KiB", "MiB"):
-                if abs(n) < 1024.0:
-                    return f"{n:3.1f}{unit}"
-                n /= 1024.0
-            return f"{n:.1f}GiB"
+    def wrapper(num_workers, iterations):
+        # Warm up with a single iteration: enough to import, compile and
+        # start everything once, without paying a full extra run per case
+        _ = func(num_workers, 1)
 
         times = []
-        tracemalloc_peaks = []
-
-        for _ in range(5):
-            if MEM_TRACK:
-                tracemalloc.start()
-
-            start = time.perf_counter()
-            result = func(*args, **kwargs)
-            end = time.perf_counter()
-
-            if MEM_TRACK:
-                _, peak = tracemalloc.get_traced_memory()
-                tracemalloc_peaks.append(peak)
+        mem_peaks = []
+        perf_counter_ns = time.perf_counter_ns
+        trace = MEM_TRACK and MEM_MODE == "tracemalloc"
+        rss = MEM_TRACK and MEM_MODE == "rss"
+
+        # Trace for the whole loop and reset the peak per run, rather than
+        # paying tracemalloc's start/stop inside every measurement
+        if trace:
+            tracemalloc.start()
+        try:
+            for _ in range(SAMPLES):
+                if trace:
+                    tracemalloc.reset_peak()
+                    base = tracemalloc.get_traced_memory()[0]
+                elif rss:
+                    _reset_peak_rss()
+                    base = _rss_status()[0]
+
+                start = perf_counter_ns()
+                result = func(num_workers, iterations)
+                end = perf_counter_ns()
+
+                if trace:
+                    mem_peaks.append(tracemalloc.get_traced_memory()[1] - base)
+                elif rss:
+                    mem_peaks.append(_rss_status()[1] - base)
+
+                times.append(end - start)
+        finally:
+            if trace:
                 tracemalloc.stop()
 
-            times.append(end - start)
-
-        avg_time = sum(times) / len(times)
+        avg_time = sum(times) / len(times) / 1e9
+        # statistics rather than numpy, which would add its import to the
+        # memory this benchmark is run under
+        stats = f"avg time: {avg_time:.6f}s"
+        if len(times) > 1:
+            cuts = statistics.quantiles(times, n=20, method="inclusive")
+            stats += f", p50: {cuts[9] / 1e9:.6f}s, p95: {cuts[18] / 1e9:.6f}s"
         if MEM_TRACK:
-            avg_peak = sum(tracemalloc_peaks) / len(tracemalloc_peaks)
-            print(f"{func.__name__}: avg time: {avg_time:.6f}s, avg tracemalloc peak: {fmt_bytes(avg_peak)}")
+            avg_peak = sum(mem_peaks) / len(mem_peaks)
+            label = "tracemalloc peak" if trace else "peak RSS growth"
+            print(f"{func.__name__}: {stats}, avg {label}: {fmt_bytes(avg_peak)}")
         else:
-            print(f"{func.__name__}: avg time: {avg_time:.6f}s")
+            print(f"{func.__name__}: {stats}")
 
         return result
 
@@ -54,17 +163,29 @@ def _noop():
     x = 1
     x += 1
 
+# Minimal-work worker for the thread benchmarks: a single C call with no
+# Python frame, so only creation/dispatch is measured. The process
+# benchmarks keep _noop, which pickles by name
+_NOOP = ().__len__
+
+def _noop_ignored(_):
+    # _noop for Pool.map, which passes one argument
+    _noop()
+
 @perf_timer
 def repeated_creation(num_threads: int, iterations: int):
     """
     Create and start thread immediately.
     """
+    # One list reused across iterations instead of a new one per iteration,
+    # and locals instead of global lookups in the loop
+    threads = [None] * num_threads
+    Thread, noop = threading.Thread, _NOOP
     for _ in range(iterations):
-        threads = []
-        for _ in range(num_threads):
-            t = threading.Thread(target=_noop)
+        for i in range(num_threads):
+            t = Thread(target=noop)
             t.start()
-            threads.append(t)
+            threads[i] = t
         for t in threads:
             t.join()
     return True
@@ -74,8 +195,11 @@ def batched_creation(num_threads: int, iterations: int):
     """
     Create threads and start them in batch.
     """
+    threads = [None] * num_threads
+    Thread, noop = threading.Thread, _NOOP
     for _ in range(iterations):
-        threads = [threading.Thread(target=_noop) for _ in range(num_threads)]
+        for i in range(num_threads):
+            threads[i] = Thread(target=noop)
         for t in threads:
             t.start()
         for t in threads:
@@ -83,14 +207,66 @@ def batched_creation(num_threads: int, iterations: int):
     return True
 
 
+def _noop_count():
+    _NOOP()
+    sync_lib.counter_incr(1)
+
+@perf_timer
+def batched_creation_spin(num_threads: int, iterations: int):
+    """
+    Create threads in batch, wait on a native atomic counter instead of join().
+    """
+    # With the GIL a pure spin only hands it over every switch interval,
+    # so yield on each check there
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    counter_get = sync_lib.counter_get
+    for _ in range(iterations):
+        sync_lib.counter_reset()
+        threads = [threading.Thread(target=_noop_count) for _ in range(num_threads)]
+        for t in threads:
+            t.start()
+        while counter_get() < num_threads:
+            if gil:
+                time.sleep(0)
+    return True
+
+
+@perf_timer
+def bare_thread_creation(num_threads: int, iterations: int):
+    """
+    Start raw threads with _thread.start_new_thread and join on a counter.
+    """
+    # Skips threading.Thread's object, name and _limbo/_active bookkeeping;
+    # what's left is the OS thread plus the new thread state
+    done_cv = threading.Condition()
+    done = [0]
+
+    def runner():
+        _NOOP()
+        with done_cv:
+            done[0] += 1
+            if done[0] == num_threads:
+                done_cv.notify()
+
+    for _ in range(iterations):
+        done[0] = 0
+        for _ in range(num_threads):
+            _thread.start_new_thread(runner, ())
+        with done_cv:
+            done_cv.wait_for(lambda: done[0] == num_threads)
+    return True
+
+
 @perf_timer
 def threadpool_creation_per_iteration(num_threads: int, iterations: int):
     """
     Create a ThreadPoolExecutor each iteration.
     """
+    futures = [None] * num_threads
     for _ in range(iterations):
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as ex:
-            futures = [ex.submit(_noop) for _ in range(num_threads)]
+            for i in range(num_threads):
+                futures[i] = ex.submit(_NOOP)
             for f in futures:
                 f.result()
     return True
@@ -101,20 +277,191 @@ def threadpool_creation_reuse(num_threads: int, iterations: int):
     """
     Create one ThreadPoolExecutor and reuse it across iterations.
     """
+    futures = [None] * num_threads
     with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as ex:
         for _ in range(iterations):
-            futures = [ex.submit(_noop) for _ in range(num_threads)]
+            for i in range(num_threads):
+                futures[i] = ex.submit(_NOOP)
             for f in futures:
                 f.result()
     return True
 
 
+@perf_timer
+def threadpool_reuse_lite(num_threads: int, iterations: int):
+    """
+    Reuse hand-rolled workers fed bare callables from a deque (no Futures).
+    """
+    q = collections.deque()
+    cond = threading.Condition()
+    done_cv = threading.Condition()
+    pending = [0]
+
+    def worker():
+        while True:
+            with cond:
+                cond.wait_for(lambda: q)
+                fn = q.popleft()
+            if fn is None:
+                return
+            fn()
+            with done_cv:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    done_cv.notify()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(num_threads)]
+    for t in workers:
+        t.start()
+
+    batch = [_NOOP] * num_threads
+    try:
+        for _ in range(iterations):
+            with done_cv:
+                pending[0] = num_threads
+            with cond:
+                q.extend(batch)
+                cond.notify_all()
+            with done_cv:
+                done_cv.wait_for(lambda: pending[0] == 0)
+    finally:
+        with cond:
+            q.extend([None] * num_threads)
+            cond.notify_all()
+        for t in workers:
+            t.join()
+    return True
+
+
+@perf_timer
+def threadpool_reuse_latch(num_threads: int, iterations: int):
+    """
+    Reuse workers that count completions down on one shared semaphore.
+    """
+    # No Future per task: the join is n acquires of a single semaphore
+    tasks = queue.SimpleQueue()
+    finished = threading.Semaphore(0)
+
+    def worker():
+        while True:
+            fn = tasks.get()
+            if fn is None:
+                return
+            fn()
+            finished.release()
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(num_threads)]
+    for t in workers:
+        t.start()
+
+    try:
+        for _ in range(iterations):
+            for _ in range(num_threads):
+                tasks.put(_NOOP)
+            for _ in range(num_threads):
+                finished.acquire()
+    finally:
+        for _ in range(num_threads):
+            tasks.put(None)
+        for t in workers:
+            t.join()
+    return True
+
+
+class ForkUnionPool:
+    """
+    Fixed set of threads that all run the same callable per round (fork-join).
+
+    A round is published by storing the callable and bumping a generation
+    number; each worker acknowledges by writing the generation into its own
+    slot. No locks, queues or per-task objects on the dispatch path. Waiting
+    spins with time.sleep(0), which lets the other threads take the GIL on
+    the default build and is a cheap yield on the free-threaded one.
+    """
+
+    def __init__(self, num_threads):
+        self._fn = None
+        self._gen = 0
+        self._done = [0] * num_threads
+        self._threads = [threading.Thread(target=self._worker, args=(i,), daemon=True)
+                         for i in range(num_threads)]
+        for t in self._threads:
+            t.start()
+
+    def _worker(self, idx):
+        if PIN_CPUS:
+            _pin_to_cpu(idx)
+        seen = 0
+        done = self._done
+        while True:
+            while self._gen == seen:
+                time.sleep(0)
+            seen = self._gen
+            fn = self._fn
+            if fn is None:
+                return
+            fn()
+            done[idx] = seen
+
+    def for_threads(self, fn):
+        """Run fn once on every worker and wait for all of them."""
+        self._fn = fn
+        self._gen += 1
+        gen = self._gen
+        for i in range(len(self._done)):
+            while self._done[i] != gen:
+                time.sleep(0)
+
+    def close(self):
+        self._fn = None
+        self._gen += 1
+        for t in self._threads:
+            t.join()
+
+
+@perf_timer
+def fork_join_pool_reuse(num_threads: int, iterations: int):
+    """
+    Reuse one ForkUnionPool, broadcasting _NOOP to every worker each iteration.
+    """
+    pool = ForkUnionPool(num_threads)
+    try:
+        for _ in range(iterations):
+            pool.for_threads(_NOOP)
+    finally:
+        pool.close()
+    return True
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _nb_fork_join(num_threads, iterations):
+        # Each prange is one fork-join round on Numba's native thread pool.
+        # The store keeps the body from being optimized away
+        out = [0] * num_threads
+        for _ in range(iterations):
+            for i in prange(num_threads):
+                out[i] += 1
+        return out
+
+
+@perf_timer
+def numba_fork_join(num_threads: int, iterations: int):
+    """
+    Compiled baseline: fork-join rounds on Numba's thread pool, no Python threads.
+    """
+    # Numba's pool can't grow past NUMBA_NUM_THREADS (the CPU count by default)
+    set_num_threads(min(num_threads, numba_config.NUMBA_NUM_THREADS))
+    _nb_fork_join(num_threads, iterations)
+    return True
+
+
 @perf_timer
 def process_creation(num_procs: int, iterations: int):
     """
     Create and start processes immediately.
     """
-    ctx = multiprocessing.get_context()
+    ctx = _get_context()
     for _ in range(iterations):
         procs = []
         for _ in range(num_procs):
@@ -126,16 +473,30 @@ def process_creation(num_procs: int, iterations: int):
     return True
 
 
+@perf_timer
+def posix_spawn_creation(num_procs: int, iterations: int):
+    """
+    Launch a fresh interpreter per worker with os.posix_spawn (vfork+exec on Linux).
+    """
+    # Cost doesn't grow with the parent's memory the way fork's page table copy does
+    argv = [sys.executable, "-S", "-c", "pass"]
+    for _ in range(iterations):
+        pids = [os.posix_spawn(sys.executable, argv, os.environ) for _ in range(num_procs)]
+        for pid in pids:
+            os.waitpid(pid, 0)
+    return True
+
+
 @perf_timer
 def process_pool_per_iteration(num_procs: int, iterations: int):
     """
     Create a multiprocessing.Pool each iteration.
     """
+    ctx = _get_context()
+    tasks = range(num_procs)
     for _ in range(iterations):
-        with multiprocessing.Pool(processes=num_procs) as pool:
-            results = [pool.apply_async(_noop) for _ in range(num_procs)]
-            for r in results:
-                r.get()
+        with ctx.Pool(processes=num_procs) as pool:
+            pool.map(_noop_ignored, tasks, chunksize=1)
     return True
 
 
@@ -144,37 +505,57 @@ def process_pool_reuse(num_procs: int, iterations: int):
     """
     Create one multiprocessing.Pool and reuse it across iterations.
     """
-    with multiprocessing.Pool(processes=num_procs) as pool:
+    tasks = range(num_procs)
+    with _get_context().Pool(processes=num_procs) as pool:
         for _ in range(iterations):
-            results = [pool.apply_async(_noop) for _ in range(num_procs)]
-            for r in results:
-                r.get()
+            pool.map(_noop_ignored, tasks, chunksize=1)
     return True
 
 BENCHMARKS = {
     "repeated_creation": (repeated_creation, "thread"),
     "batched_creation": (batched_creation, "thread"),
+    "batched_creation_spin": (batched_creation_spin, "thread"),
+    "bare_creation": (bare_thread_creation, "thread"),
     "threadpool_per_iter": (threadpool_creation_per_iteration, "thread"),
     "threadpool_reuse": (threadpool_creation_reuse, "thread"),
+    "threadpool_reuse_lite": (threadpool_reuse_lite, "thread"),
+    "threadpool_reuse_latch": (threadpool_reuse_latch, "thread"),
+    "fork_join_reuse": (fork_join_pool_reuse, "thread"),
+    "numba_fork_join": (numba_fork_join, "thread"),
     "process_creation": (process_creation, "process"),
+    "posix_spawn_creation": (posix_spawn_creation, "process"),
     "process_pool_per_iter": (process_pool_per_iteration, "process"),
     "process_pool_reuse": (process_pool_reuse, "process"),
 }
+if not hasattr(os, "posix_spawn"):
+    del BENCHMARKS["posix_spawn_creation"]
+if njit is None:
+    del BENCHMARKS["numba_fork_join"]
 
 def run_sweep(thread_counts, iterations, selected):
     print(f"sys._is_gil_enabled: {getattr(sys, '_is_gil_enabled', lambda: True)()}")
     print(f"Iterations per case: {iterations}")
+    # Look each benchmark up once, not once per worker count
+    resolved = [(name, *BENCHMARKS[name]) for name in selected]
+    if any(kind == "process" for _, _, kind in resolved):
+        print(f"Start method: {_get_context().get_start_method()}")
+
+    global sync_lib
+    if "batched_creation_spin" in selected:
+        sync_lib = _load_sync_lib()
 
     for n in thread_counts:
         print("\n---")
         print(f"Workers: {n}")
 
-        for name in selected:
-            func, kind = BENCHMARKS[name]
+        for name, func, kind in resolved:
             # Skip process benchmarks if iterations/workers too high
             if kind == "process" and (iterations > 20 or n > 16):
                 print(f"{name}: skipped (iterations > 20 or workers > 16)")
                 continue
+            if name == "batched_creation_spin" and sync_lib is None:
+                print(f"{name}: skipped (could not build _sync.c, is a C compiler installed?)")
+                continue
             _ = func(n, iterations)
 
 
@@ -187,16 +568,26 @@ def main():
   python thread_overhead.py --mode threads --iters 50
   python thread_overhead.py --benchmarks repeated_creation batched_creation
   python thread_overhead.py --mem --threads 8
+  python thread_overhead.py --mode processes --start-method forkserver
 
 Available benchmarks:
   Thread-based:
     repeated_creation      - Create and start threads immediately
     batched_creation       - Create threads then start in batch
+    batched_creation_spin  - Batch start, spin on a C atomic counter instead of join
+                             (needs a C compiler)
+    bare_creation          - Start raw _thread threads, join on a counter
     threadpool_per_iter    - Create ThreadPoolExecutor each iteration
     threadpool_reuse       - Reuse single ThreadPoolExecutor
+    threadpool_reuse_lite  - Reuse deque+Condition workers, no Futures
+    threadpool_reuse_latch - Reuse SimpleQueue workers joined on one semaphore
+    fork_join_reuse        - Reuse a lock-free fork-join pool (ForkUnionPool)
+    numba_fork_join        - prange rounds on Numba's thread pool, compiled
+                             baseline (needs numba)
 
   Process-based (limited to iterations <= 20, workers <= 16):
     process_creation       - Create and start processes immediately
+    posix_spawn_creation   - Spawn a new interpreter per worker with os.posix_spawn
     process_pool_per_iter  - Create multiprocessing.Pool each iteration
     process_pool_reuse     - Reuse single multiprocessing.Pool
 """
@@ -205,16 +596,42 @@ Available benchmarks:
                    help="Worker counts to test (default: 1 2 4 8 16)")
     p.add_argument("--iters", type=int, default=20,
                    help="Iterations per case (default: 20)")
+    p.add_argument("--samples", type=int, default=5,
+                   help="Timed runs per case, for the avg/p50/p95 (default: 5)")
+    p.add_argument("--pin-cpus", action="store_true",
+                   help="Run on a fixed set of CPUs (the first max(--threads) allowed) and pin each "
+                        "fork_join_reuse worker to its own CPU (Linux)")
     p.add_argument("--mem", action="store_true",
-                   help="Enable tracemalloc memory tracking")
+                   help="Enable memory tracking")
+    p.add_argument("--mem-mode", choices=["rss", "tracemalloc"], default="rss",
+                   help="With --mem: peak RSS above the RSS at the start of each run (Linux, the "
+                        "peak is reset through /proc/self/clear_refs; no overhead on the timed code) "
+                        "or tracemalloc's allocation peak (default: rss)")
     p.add_argument("--mode", choices=["all", "threads", "processes"], default="all",
                    help="Run thread benchmarks, process benchmarks, or all (default: all)")
+    p.add_argument("--start-method", choices=multiprocessing.get_all_start_methods(), default=None,
+                   help="multiprocessing start method for the process benchmarks (default: platform default)")
     p.add_argument("--benchmarks", type=str, nargs="+", choices=list(BENCHMARKS.keys()),
                    help="Select specific benchmarks to run (overrides --mode)")
     args = p.parse_args()
 
-    global MEM_TRACK
+    if args.samples < 1:
+        p.error("--samples must be >= 1")
+
+    global MEM_TRACK, MEM_MODE, START_METHOD, SAMPLES, PIN_CPUS
     MEM_TRACK = bool(args.mem)
+    MEM_MODE = args.mem_mode
+    if MEM_TRACK and MEM_MODE == "rss" and not _reset_peak_rss():
+        print("--mem-mode rss needs a resettable peak RSS (/proc/self/clear_refs), using tracemalloc")
+        MEM_MODE = "tracemalloc"
+    SAMPLES = args.samples
+    PIN_CPUS = args.pin_cpus and ALLOWED_CPUS is not None
+    if args.pin_cpus and not PIN_CPUS:
+        print("--pin-cpus ignored: os.sched_setaffinity not available")
+    if PIN_CPUS:
+        # Threads inherit this, so nothing migrates off the set mid-sweep
+        os.sched_setaffinity(0, set(ALLOWED_CPUS[:max(args.threads)]))
+    START_METHOD = args.start_method
 
     # Determine which benchmarks to run
     if args.benchmarks:
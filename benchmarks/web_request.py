@@ -1,57 +1,289 @@
 import argparse
+import asyncio
+import functools
+import gc
 import hashlib
+import queue
+import http.client
 import http.server
 import os
 import socket
+import statistics
 import sys
 import tempfile
 import threading
 import time
-import urllib.request
+import urllib.parse
 from concurrent.futures import ThreadPoolExecutor
 
+# CPUs this process may run on, captured before any thread gets pinned
+ALLOWED_CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+# Pin each fetch thread to its own CPU (--pin-cpus)
+PIN_CPUS = False
+
+# Timed runs per fetch method (--runs)
+RUNS = 3
+# Append pyperf-style "### name ###" / "Mean +- std dev:" results here (--pyperf-log)
+PYPERF_LOG = None
+
+def _fmt_pyperf(seconds):
+    """Format seconds like pyperf (sec/ms/us/ns), with one more significant digit."""
+    for unit, scale in (("sec", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            break
+    else:
+        unit, scale = "ns", 1e-9
+    return f"{seconds / scale:.4g} {unit}"
+
 def perf_timer(func):
     def wrapper(*args, **kwargs):
         # warmup
         _ = func(*args, **kwargs)
 
+        # Collect once, then keep the collector from firing inside a timed run
+        gc.collect()
+        gc_enabled = gc.isenabled()
+        gc.disable()
         times = []
-        for _ in range(3):
-            start = time.perf_counter()
-            result = func(*args, **kwargs)
-            end = time.perf_counter()
-            times.append(end - start)
-
-        print(f"{func.__name__}: runs: {times}, avg: {sum(times)/len(times):.4f}s")
+        cpu_times = []
+        try:
+            for _ in range(RUNS):
+                cpu_start = time.process_time_ns()
+                start = time.perf_counter_ns()
+                result = func(*args, **kwargs)
+                times.append(time.perf_counter_ns() - start)
+                cpu_times.append(time.process_time_ns() - cpu_start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # Integer nanoseconds, converted to seconds only when reporting
+        runs = [t / 1e9 for t in times]
+        mean = statistics.fmean(times) / 1e9
+        # CPU time is for the whole process, so it includes the server threads
+        print(f"{func.__name__}: runs: {runs}, avg: {mean:.4f}s, "
+              f"median: {statistics.median(times) / 1e9:.4f}s, min: {min(times) / 1e9:.4f}s, "
+              f"cpu avg: {statistics.fmean(cpu_times) / 1e9:.4f}s")
+        if PYPERF_LOG:
+            std = statistics.stdev(runs) if len(runs) > 1 else 0.0
+            with open(PYPERF_LOG, "a") as f:
+                f.write(f"### {func.__name__} ###\n"
+                        f"Mean +- std dev: {_fmt_pyperf(mean)} +- {_fmt_pyperf(std)}\n\n")
         return result
 
     return wrapper
 
+def _pin_to_cpu(idx):
+    """Pin the calling thread to the idx'th allowed CPU (wrapping around)."""
+    os.sched_setaffinity(0, {ALLOWED_CPUS[idx % len(ALLOWED_CPUS)]})
+
+_POOLS = {}
+
+def _get_pool(num_workers):
+    """Return a ThreadPoolExecutor with num_workers workers, created on first use and reused.
+
+    The first (warmup) run pays for starting the workers, so the timed runs
+    only measure fetching. With --pin-cpus each worker pins itself to the
+    next CPU as it starts.
+    """
+    pool = _POOLS.get(num_workers)
+    if pool is None:
+        kwargs = {}
+        if PIN_CPUS:
+            ids = queue.SimpleQueue()
+            for i in range(num_workers):
+                ids.put(i)
+            kwargs = {"initializer": lambda: _pin_to_cpu(ids.get())}
+        pool = _POOLS[num_workers] = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="fetch", **kwargs)
+    return pool
+
 
 def write_files(base_dir, num_files=10, size_mb=64):
     """Create num_files files of size size_mb in base_dir and return their names."""
     names = []
-    chunk = b"A" * 1024 * 1024
+    size = size_mb * 1024 * 1024
+    data = memoryview(b"A" * size)  # one buffer shared by every file
     for i in range(num_files):
         name = f"file_{i}.bin"
-        path = os.path.join(base_dir, name)
-        with open(path, "wb") as f:
-            for _ in range(size_mb):
-                f.write(chunk)
+        fd = os.open(os.path.join(base_dir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if size and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            # A single write normally does it, but the kernel may return early
+            written = 0
+            while written < size:
+                written += os.write(fd, data[written:])
+        finally:
+            os.close(fd)
         names.append(name)
     return names
 
 
-def sha256_bytes(b: bytes) -> str:
-    h = hashlib.sha256()
-    h.update(b)
-    return h.hexdigest()
+# Bytes read from the socket per hash update, and the least handed to
+# a single update unless the body ends first
+FETCH_CHUNK = 128 * 1024
+MIN_UPDATE = 16 * 1024
+
+# Tree hashing: number of threads hashing 1 MiB shards of each response,
+# 0 hashes the response in one stream
+TREE_HASH = 0
+HASH_SHARD = 1024 * 1024
 
+# Client receive buffer size (SO_RCVBUF)
+RCVBUF = 4 << 20
+
+def _tune_socket(sock):
+    """Send small requests/headers immediately and ACK without delay."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, "TCP_QUICKACK"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
+# One keep-alive socket per thread and host, reused across requests
+_CONNS = threading.local()
+
+# Per-thread receive buffer, reused across requests
+_local = threading.local()
+
+def _recv_buffer():
+    """Return this thread's receive buffer and a memoryview of it, allocated once per thread."""
+    try:
+        return _local.buf, _local.view
+    except AttributeError:
+        _local.buf = bytearray(FETCH_CHUNK)
+        _local.view = memoryview(_local.buf)
+        return _local.buf, _local.view
+
+def _get_sock(netloc, timeout):
+    socks = _CONNS.__dict__
+    sock = socks.get(netloc)
+    if sock is None:
+        host, _, port = netloc.rpartition(":")
+        sock = socket.create_connection((host, int(port)), timeout)
+        _tune_socket(sock)
+        # A large receive buffer keeps the TCP window open while hashing catches up
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        socks[netloc] = sock
+    return sock
+
+def _recv_head(sock, buf):
+    """Receive into buf until the end of the response headers.
+
+    Return (status, content_length, body_start, received).
+    """
+    received = 0
+    while True:
+        n = sock.recv_into(memoryview(buf)[received:])
+        if not n:
+            raise ConnectionError("connection closed before the response headers")
+        received += n
+        end = buf.find(b"\r\n\r\n", 0, received)
+        if end >= 0:
+            break
+        if received == len(buf):
+            raise http.client.HTTPException("response headers too long")
+    head = bytes(buf[:end]).lower()
+    status = int(head.split(None, 2)[1])
+    i = head.find(b"\r\ncontent-length:")
+    if i < 0:
+        # The local servers always send Content-Length
+        raise http.client.HTTPException("response without Content-Length")
+    length = int(head[i + 17:].split(b"\r\n", 1)[0])
+    return status, length, end + 4, received
+
+def _body_chunks(sock, view, start, received, length):
+    """Yield memoryviews over the response body, starting with what _recv_head already read."""
+    pending = min(received - start, length)
+    if pending:
+        yield view[start:start + pending]
+    remaining = length - pending
+    while remaining:
+        # Batch short recvs so each hash update is big enough for hashlib
+        # to drop the GIL (it only does for buffers of HASHLIB_GIL_MINSIZE,
+        # 2048 bytes, or more; see Modules/hashlib.h)
+        want = min(len(view), remaining)
+        filled = 0
+        while filled < min(MIN_UPDATE, want):
+            n = sock.recv_into(view[filled:want])
+            if not n:
+                raise ConnectionError("connection closed mid-body")
+            filled += n
+        yield view[:filled]
+        remaining -= filled
+
+# Fresh SHA-256 state that every response's hash is copied from; copying an
+# initialized context is cheaper than constructing one. Never updated.
+_SHA256_SEED = hashlib.sha256()
+
+_HASH_POOL = None
+
+def _get_hash_pool():
+    """Return the shard hashing executor, created on first use and reused after that."""
+    global _HASH_POOL
+    if _HASH_POOL is None:
+        _HASH_POOL = ThreadPoolExecutor(max_workers=TREE_HASH)
+    return _HASH_POOL
+
+def _shard_digest(shard):
+    return hashlib.sha256(shard).digest()
+
+def _tree_hash(chunks):
+    """Hash fixed-size shards of the body in parallel and return the hash of their digests."""
+    pool = _get_hash_pool()
+    futures = []
+    shard = bytearray()
+    for chunk in chunks:
+        shard += chunk
+        if len(shard) >= HASH_SHARD:
+            futures.append(pool.submit(_shard_digest, bytes(shard[:HASH_SHARD])))
+            del shard[:HASH_SHARD]
+    if shard:
+        futures.append(pool.submit(_shard_digest, bytes(shard)))
+    return hashlib.sha256(b"".join(f.result() for f in futures)).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _request_for(url):
+    """Return (netloc, GET request bytes) for url, parsed once per distinct url."""
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return parts.netloc, f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n\r\n".encode("latin-1")
 
 def fetch_url(url, timeout=20):
-    with urllib.request.urlopen(url, timeout=timeout) as r:
-        data = r.read()
-    return sha256_bytes(data)
+    netloc, request = _request_for(url)
+    buf, view = _recv_buffer()
+    for attempt in range(2):
+        sock = _get_sock(netloc, timeout)
+        try:
+            sock.sendall(request)
+            status, length, start, received = _recv_head(sock, buf)
+            break
+        except ConnectionError:
+            # The server dropped an idle connection; reconnect once
+            sock.close()
+            del _CONNS.__dict__[netloc]
+            if attempt:
+                raise
+
+    # Hash the body as it arrives instead of buffering the whole file
+    chunks = _body_chunks(sock, view, start, received, length)
+    try:
+        if TREE_HASH:
+            digest = _tree_hash(chunks)
+        else:
+            h = _SHA256_SEED.copy()
+            for chunk in chunks:
+                h.update(chunk)
+            digest = h.hexdigest()
+    except OSError:
+        # Part of the body may still be in flight; don't reuse the socket
+        sock.close()
+        del _CONNS.__dict__[netloc]
+        raise
+    if status != 200:
+        raise http.client.HTTPException(f"GET {url}: {status}")
+    return digest
 
 @perf_timer
 def serial_fetch(urls):
@@ -62,32 +294,82 @@ def serial_fetch(urls):
 def threaded_fetch(urls, num_threads=4):
     results = [None] * len(urls)
 
-    def worker(idx):
-        for i in range(idx, len(urls), num_threads):
-            results[i] = fetch_url(urls[i])
+    # Threads pull the next URL as they finish one, so a slow request
+    # doesn't hold back a fixed share of the others
+    todo = queue.SimpleQueue()
+    for item in enumerate(urls):
+        todo.put(item)
 
-    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    def worker(_):
+        while True:
+            try:
+                i, url = todo.get_nowait()
+            except queue.Empty:
+                return
+            results[i] = fetch_url(url)
+
+    list(_get_pool(num_threads).map(worker, range(num_threads)))
     return results
 
 
 @perf_timer
 def executor_fetch(urls, num_workers=4):
-    with ThreadPoolExecutor(max_workers=num_workers) as ex:
-        return list(ex.map(fetch_url, urls))
+    return list(_get_pool(num_workers).map(fetch_url, urls))
+
+
+# Files up to this size are answered from memory; bigger ones use sendfile
+CACHE_MAX = 1024 * 1024
+
+def _cached_responses(directory):
+    """Return {url_path: complete 200 response bytes} for the small files in directory."""
+    cache = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getsize(path) <= CACHE_MAX:
+            with open(path, "rb") as f:
+                body = f.read()
+            cache["/" + name] = (b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                                 b"Content-Length: %d\r\n\r\n" % len(body)) + body
+    return cache
 
 
 class _SilentHandler(http.server.SimpleHTTPRequestHandler):
     delay = 0  # seconds to sleep before serving each request
+    # HTTP/1.1 keeps the connection open between requests (responses carry
+    # Content-Length), so clients don't reconnect for every file
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, files=None, cache=None, **kwargs):
+        # Set before super().__init__, which handles the whole connection
+        self.files = files or {}
+        self.cache = cache or {}
+        super().__init__(*args, **kwargs)
+
+    def setup(self):
+        super().setup()
+        _tune_socket(self.connection)
+
+    def translate_path(self, path):
+        # The served files are known up front; skip the normpath/split walk
+        full = self.files.get(path)
+        return full if full is not None else super().translate_path(path)
 
     def do_GET(self):
         if self.delay > 0:
             time.sleep(self.delay)
+        response = self.cache.get(self.path)
+        if response is not None:
+            # Pre-rendered headers and body in one shared bytes object
+            self.wfile.write(response)
+            return
         return super().do_GET()
 
+    def copyfile(self, source, outputfile):
+        # wfile is unbuffered and the headers are already flushed, so hand the
+        # file straight to the socket; socket.sendfile uses sendfile(2) and
+        # the body never passes through Python buffers
+        self.connection.sendfile(source)
+
     def log_message(self, format, *args):
         pass
 
@@ -95,9 +377,9 @@ class ThreadingHTTPServerWithQueue(http.server.ThreadingHTTPServer):
     request_queue_size = 128
 
 def start_server(directory, port, backlog=None):
-    handler_class = _SilentHandler
-
-    os.chdir(directory)
+    files = {"/" + name: os.path.join(directory, name) for name in os.listdir(directory)}
+    handler_class = functools.partial(_SilentHandler, directory=directory, files=files,
+                                      cache=_cached_responses(directory))
 
     if backlog is not None:
         class _CustomQueueServer(http.server.ThreadingHTTPServer):
@@ -116,6 +398,95 @@ def start_server(directory, port, backlog=None):
     return server, thread
 
 
+class _AsyncServer:
+    """asyncio HTTP/1.1 file server on its own event loop thread.
+
+    Serves the files in directory from fds opened once at startup, sending
+    each body with loop.sendfile, or from memory for files up to CACHE_MAX.
+    Exposes shutdown/server_close like the
+    socketserver servers.
+    """
+
+    def __init__(self, directory, port, backlog=None, delay=0):
+        self.delay = delay
+        self.writers = set()
+        self.cache = _cached_responses(directory)
+        self.files = {}
+        for name in os.listdir(directory):
+            f = open(os.path.join(directory, name), "rb")
+            self.files["/" + name] = (f, os.fstat(f.fileno()).st_size)
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self._handle, "127.0.0.1", port, backlog=backlog or 128))
+
+    async def _handle(self, reader, writer):
+        # asyncio already sets TCP_NODELAY on TCP transports
+        _tune_socket(writer.get_extra_info("socket"))
+        self.writers.add(writer)
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                # Skip the headers; the client never sends a body
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                if self.delay > 0:
+                    await asyncio.sleep(self.delay)
+                path = urllib.parse.unquote(request.split()[1].decode("latin-1"))
+                response = self.cache.get(path)
+                if response is not None:
+                    writer.write(response)
+                    await writer.drain()
+                    continue
+                entry = self.files.get(path)
+                if entry is None:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                    continue
+                f, size = entry
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                             b"Content-Length: %d\r\n\r\n" % size)
+                # sendfile takes an explicit offset, so connections can share the fd
+                await self.loop.sendfile(writer.transport, f, 0, size)
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def serve_forever(self):
+        self._stopped = threading.Event()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._stopped.set()
+
+    def shutdown(self):
+        # Block until the loop thread has returned, like socketserver
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._stopped.wait()
+
+    def server_close(self):
+        self.server.close()
+        # Wake handlers parked on idle keep-alive connections with EOF
+        for w in self.writers:
+            w.transport.abort()
+        tasks = asyncio.all_tasks(self.loop)
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+        for f, _ in self.files.values():
+            f.close()
+
+
+def start_async_server(directory, port, backlog=None):
+    server = _AsyncServer(directory, port, backlog, delay=_SilentHandler.delay)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, thread
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Web request benchmark comparing serial, threaded, and executor-based fetching")
     parser.add_argument("--num-files", type=int, default=12, help="Number of files to create (default: 12)")
@@ -124,10 +495,31 @@ if __name__ == "__main__":
     parser.add_argument("--mode", type=str, choices=["serial", "threaded", "executor", "all"], default="all",
                         help="Fetch mode (default: all)")
     parser.add_argument("--delay", type=float, default=0, help="Delay in seconds before serving each request (default: 0)")
+    parser.add_argument("--tree-hash", type=int, default=0, metavar="N",
+                        help="Hash 1 MiB shards of each response on N threads and report the hash of the "
+                             "shard digests; checksums differ from plain SHA-256 (default: 0, off)")
+    parser.add_argument("--server", type=str, choices=["threading", "asyncio"], default="threading",
+                        help="Local server: ThreadingHTTPServer or a single-threaded asyncio server "
+                             "(default: threading)")
+    parser.add_argument("--pin-cpus", action="store_true",
+                        help="Pin each fetch thread to a distinct CPU to avoid migrations between runs")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per fetch method (default: 3)")
+    parser.add_argument("--pyperf-log", metavar="FILE",
+                        help="Also append each method's mean +- std dev to FILE in pyperf's text format, "
+                             "for pyperf_results/compare_full_bench.py")
     args = parser.parse_args()
+    RUNS = max(1, args.runs)
+    PYPERF_LOG = args.pyperf_log
+    PIN_CPUS = args.pin_cpus and ALLOWED_CPUS is not None
+    if args.pin_cpus and not PIN_CPUS:
+        print("--pin-cpus ignored: os.sched_setaffinity not available")
 
     print("GIL is enabled: " + str(sys._is_gil_enabled()))
 
+    TREE_HASH = args.tree_hash
+    if TREE_HASH:
+        print(f"Tree hashing {HASH_SHARD // 1024} KiB shards on {TREE_HASH} threads")
+
     # Set the delay for the server handler
     _SilentHandler.delay = args.delay
 
@@ -139,7 +531,10 @@ if __name__ == "__main__":
     _, port = s.getsockname()
     s.close()
 
-    server, thread = start_server(tmpdir, port)
+    if args.server == "asyncio":
+        server, thread = start_async_server(tmpdir, port)
+    else:
+        server, thread = start_server(tmpdir, port)
     urls = [f"http://127.0.0.1:{port}/{name}" for name in names]
     print(f"Started local server on port {port}, serving {len(names)} files from {tmpdir}")
 
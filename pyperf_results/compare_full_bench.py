@@ -1,46 +1,42 @@
 import argparse
 import re
+import statistics
 from pathlib import Path
 
 
-MEAN_RE = re.compile(r"^Mean\s*\+-\s*std\s*dev:\s*(?P<mean>[\d]*\.?\d+)\s*(?P<unit>ns|us|ms|sec)\s*\+-\s*(?P<std>[\d]*\.?\d+)\s*(?P<std_unit>ns|us|ms|sec)\s*$")
+# One multiline pattern for both the "### name ###" header and the
+# "Mean +- std dev:" line, so a whole file is scanned with a single finditer.
+# [^\S\n] is whitespace other than newline: it keeps each match on one line
+# and skips the surrounding blanks that a per-line strip() would remove.
+LINE_RE = re.compile(
+    r"^[^\S\n]*(?:"
+    r"###[^\S\n]*(?P<name>.+?)[^\S\n]*###"
+    r"|Mean[^\S\n]*\+-[^\S\n]*std[^\S\n]*dev:[^\S\n]*(?P<mean>[\d]*\.?\d+)[^\S\n]*(?P<unit>ns|us|ms|sec)"
+    r"[^\S\n]*\+-[^\S\n]*(?P<std>[\d]*\.?\d+)[^\S\n]*(?P<std_unit>ns|us|ms|sec)"
+    r")[^\S\n]*$",
+    re.MULTILINE,
+)
 
-HEADER_RE = re.compile(r"^###\s*(?P<name>.+?)\s*###\s*$")
+_SEC_MAP = {
+    "sec": 1.0,
+    "ms": 1e-3,
+    "us": 1e-6,
+    "ns": 1e-9,
+}
 
 
 def parse(path):
     """Return benchmark_name -> mean_seconds."""
     data = {}
     cur_name = None
-    sec_map = {
-        "sec": 1.0,
-        "ms": 1e-3,
-        "us": 1e-6,
-        "ns": 1e-9,
-    }
-
-    with path.open("r", encoding="utf-8", errors="ignore") as f:
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-
-            m = HEADER_RE.match(line)
-            if m:
-                cur_name = m.group("name").strip()
-                continue
-
-            if cur_name is not None:
-                mm = MEAN_RE.match(line)
-                if mm:
-                    mean = float(mm.group("mean"))
-                    unit = mm.group("unit")
-                    mean_sec = mean * sec_map.get(unit, 1.0)
-                    data[cur_name] = mean_sec
-                    cur_name = None
-                    continue
-            
-            # print(line)
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    for m in LINE_RE.finditer(text):
+        name = m.group("name")
+        if name is not None:
+            cur_name = name
+        elif cur_name is not None:
+            data[cur_name] = float(m.group("mean")) * _SEC_MAP.get(m.group("unit"), 1.0)
+            cur_name = None
 
     return data
 
@@ -49,35 +45,30 @@ def compare_files(a, b):
     a_map = parse(a)
     b_map = parse(b)
 
-    keys = sorted(a_map.keys())
-
-    rows = []
-    for k in keys:
-        ta = a_map.get(k)
-        tb = b_map.get(k)
-        pct = None
-        if ta is not None and tb is not None and ta != 0:
-            pct = (tb - ta) / ta * 100.0
-        rows.append((k, ta, tb, pct))
+    # Benchmarks that only ran on one side still get a row, with N/A
+    rows = [(k, a_map.get(k), b_map.get(k)) for k in sorted(a_map.keys() | b_map.keys())]
 
     pct_values = []
-
-    print(f"Compared {a} vs {b}")
-    print(f"{'Benchmark':60} | {'A(s)':>12} | {'B(s)':>12} | {'% change':>9}")
-    print("-" * 102)
-    for name, ta, tb, pct in rows:
+    lines = [
+        f"Compared {a} vs {b}",
+        f"{'Benchmark':60} | {'A(s)':>12} | {'B(s)':>12} | {'% change':>9}",
+        "-" * 102,
+    ]
+    for name, ta, tb in rows:
         ta_s = "N/A" if ta is None else f"{ta:.6f}"
         tb_s = "N/A" if tb is None else f"{tb:.6f}"
         pct_s = "N/A"
-        if pct is not None:
+        if ta is not None and tb is not None and ta != 0:
+            pct = (tb - ta) / ta * 100.0
             pct_values.append(pct)
             pct_s = f"{pct:+7.3f}%"
-        print(f"{name[:60]:60} | {ta_s:>12} | {tb_s:>12} | {pct_s:>9}")
+        lines.append(f"{name[:60]:60} | {ta_s:>12} | {tb_s:>12} | {pct_s:>9}")
 
     # compute average percent change
-    avg_pct = sum(pct_values) / len(pct_values)
-    print()
-    print(f"Average % change across {len(pct_values)} benchmarks: {avg_pct:+7.3f}%")
+    if pct_values:
+        lines.append("")
+        lines.append(f"Average % change across {len(pct_values)} benchmarks: {statistics.fmean(pct_values):+7.3f}%")
+    print("\n".join(lines))
 
 
 if __name__ == "__main__":